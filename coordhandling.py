@@ -1,6 +1,7 @@
 from numpy import *
 import scipy.interpolate
 from vectors import unitvec
+from moments import moments
 import numpy as n
 import unittest
 
@@ -19,13 +20,31 @@ def identity3d( dims, iswhere=False ):
         return n.where(arr)
 
 
-def extract_box(data, centre, size):
+def box_slices(shape, centre, size):
+    '''returns a tuple of slices selecting a box, centered around
+    "centre" and with side of size "size", from an array of the given
+    shape, clipped at its edges, and the offset of the clipped box
+    within the full-sized one'''
+    centre = n.asarray( centre ).astype(int)
+    size = n.asarray( size ).astype(int)
+    lo = centre - size / 2
+    hi = lo + size
+    clo = n.maximum( lo, 0 )
+    chi = n.maximum( n.minimum( hi, shape ), clo )
+    return tuple( [slice(i, j) for i, j in zip( clo, chi )] ), clo - lo
+
+
+def extract_box(data, centre, size, pad=None):
     '''extracts a box from data, centered around "centre"
     (a tuple of co-ordinate) and with side of size "size"
     (a tuple of dimension sizes) or smaller if limited by
-    edges of data
+    edges of data, unless pad is given, in which case the
+    box is always full-sized, with parts outside data set
+    to pad
 
     usage: box = extract_box( data, centre, size )
+
+    data may be a ChunkedVolume, in which case only the box is read.
     '''
     ndims = len(data.shape)
     try:
@@ -35,23 +54,16 @@ def extract_box(data, centre, size):
         print "data.shape, centre and size must all have same length"
         return None
 
-    maxs = n.array( data.shape ) - 1
-    mins = n.zeros( ndims )
-    halfsize = n.array( size ) / 2
-    diverr = n.array( size ) % 2
-    lo = tuple( n.maximum( n.array( centre ) - halfsize, mins ) )
-    hi = tuple( n.minimum( n.array( centre ) \
-                              + halfsize + diverr, maxs ) )
+    box, ofs = box_slices( data.shape, centre, size )
+    if pad is None:
+        return data[box]
+    padded = PaddedView( data, -n.asarray( [sl.start for sl in box] ) \
+                             + ofs, size, fill=pad )
+    return padded[...]
 
-    extr_str = ", ".join( [ 'lo[%d]:hi[%d]' % (i,i) for \
-                            i in range( ndims ) ] )
-    box = eval( 'data[' + extr_str + ']' )
-    return box
 
-
-def ninterpol(data, points, method='linear', mid=False):
-    '''n-dimensional interpolation using sequential calls to
-    scipy.interpolate.interp1d (I hope this is valid). Based
+def ninterpol(data, points, method='linear', mid=False, out=None):
+    '''n-dimensional interpolation of values at arbitrary points. Based
     loosely (signature only) on the routine of the same name
     in perldl.
 
@@ -60,48 +72,88 @@ def ninterpol(data, points, method='linear', mid=False):
         val = ninterpol( data, point )
         
     data = volume in which to interpolate
-    point = co-ordinates of point to interpolate
-
-    Probably has the same caveats as rebin.congrid (same engine)
-    i.e. 1-D array must be promoted to shape (n,1).
+    point = co-ordinates of points to interpolate, shape (ndims, ...)
+    method = 'nearest', 'linear' or 'cubic' (Catmull-Rom)
+    out = optional array, shape point.shape[1:], to hold the result
 
     By definition the old values are defined at the lower bound of
     co-ordinate only (like points) rather than across the entire
     value (like pixels), which means that maximum offset _is_
     maxval - 1 so we don''t extrapolate
+
+    Each point is computed from only the 1, 2**ndims or 4**ndims
+    neighbouring values (nearest, linear and cubic respectively), so
+    cost is linear in the number of points. For cubic, the missing
+    neighbour in the first and last interval of each axis is
+    extrapolated linearly from the two nearest values, so linear data
+    is reproduced exactly right up to the edges.
     '''
-    ndims = len(data.shape)
-    points = n.array( points )
+    data = n.asarray( data )
+    points = n.asarray( points, dtype=float )
+    if points.shape[0] != data.ndim:
+        raise ValueError("points must have one row per dimension of data")
     if mid:
-        mid_ = 0.5
-    else:
-        mid_ = 0.
-
-    # specify old dims
-    olddims = [n.arange(i).astype(float) for i in list( data.shape )]
+        points = points - 0.5
     
-    # first interpolation - for ndims = any
-    intrp = scipy.interpolate.interp1d( olddims[-1] + mid_, data, kind=method )
-    newa = intrp( points[-1] )
-
-    trorder = [ndims - 1] + range( ndims - 1 )
-    for i in range( ndims - 2, -1, -1 ):
-        newa = newa.transpose( trorder )
-        intrp = scipy.interpolate.interp1d( olddims[i] + mid_, newa, \
-                                            kind=method )
-        newa = intrp( points[i] )
-        
-    if ndims > 1:
-        # need one more transpose to return to original dimensions
-        newa = newa.transpose( trorder )
-
-    if ndims == 3:
-        diag = identity3d( newa.shape, iswhere=True )
-    elif ndims == 2:
-        diag = n.where(identity( newa.shape[0] ))
+    # per-axis neighbour indices and weights, each shape (k,) + pts shape
+    inds, wts = [], []
+    for i in range( data.ndim ):
+        x = points[i]
+        sz = data.shape[i]
+        if n.any( x < 0 ) or n.any( x > sz - 1 ):
+            raise ValueError("A value in points is outside the " \
+                             "interpolation range.")
+        if method == 'nearest':
+            # round half down, like scipy.interpolate.interp1d
+            inds.append( n.ceil( x - 0.5 ).astype(int)[n.newaxis] )
+            wts.append( None )
+            continue
+        i0 = n.minimum( n.floor( x ).astype(int), max(sz - 2, 0) )
+        t = x - i0
+        if method == 'linear':
+            inds.append( n.array( (i0, n.minimum( i0 + 1, sz - 1 )) ) )
+            wts.append( n.array( (1 - t, t) ) )
+        elif method == 'cubic':
+            inds.append( n.clip( i0 + n.arange( -1, 3 ).reshape( \
+                (4,) + (1,) * x.ndim ), 0, sz - 1 ) )
+            t2 = t * t
+            t3 = t2 * t
+            w = n.array( (-0.5 * t3 + t2 - 0.5 * t,
+                          1.5 * t3 - 2.5 * t2 + 1,
+                          -1.5 * t3 + 2 * t2 + 0.5 * t,
+                          0.5 * t3 - 0.5 * t2) )
+            # neighbours beyond the edges are extrapolated linearly,
+            # e.g. f(-1) = 2 f(0) - f(1), by folding their weights in
+            lo = i0 == 0
+            w[1] += n.where( lo, 2 * w[0], 0. )
+            w[2] -= n.where( lo, w[0], 0. )
+            w[0] = n.where( lo, 0., w[0] )
+            hi = i0 + 2 > sz - 1
+            w[2] += n.where( hi, 2 * w[3], 0. )
+            w[1] -= n.where( hi, w[3], 0. )
+            w[3] = n.where( hi, 0., w[3] )
+            wts.append( w )
+        else:
+            raise ValueError("method must be 'nearest', 'linear' or 'cubic'")
+
+    if method == 'nearest':
+        vals = data[tuple( [ind[0] for ind in inds] )]
+        if out is None:
+            return vals
+        out[...] = vals
+        return out
+
+    if out is None:
+        out = n.zeros( points.shape[1:], \
+                       dtype=n.promote_types( data.dtype, n.float32 ) )
     else:
-        raise ValueError("ninterpol currently only supports 2 or 3 dimensions")
-    return newa[diag]
+        out[...] = 0
+    for corner in n.ndindex( *[len(ind) for ind in inds] ):
+        w = wts[0][corner[0]]
+        for i in range( 1, data.ndim ):
+            w = w * wts[i][corner[i]]
+        out += w * data[tuple( [inds[i][c] for i, c in enumerate( corner )] )]
+    return out
 
 
 def extract_line(data, ofs, vec, mid=True):
@@ -118,52 +170,86 @@ def extract_line(data, ofs, vec, mid=True):
           vals = returned values from volume
           coords = co-ordinates of extracted points'''
 
+    ofs = n.asarray( ofs, dtype=float )
+    try:
+        vals, pts, offsets = extract_lines( data, ofs[n.newaxis], \
+                                            n.asarray( vec )[n.newaxis], \
+                                            mid=mid )
+    except ValueError:
+        raise ValueError("[extract_line] Offset must be within bounds of data.")
+    return vals, pts
+
+
+def _ray_box_limits(shape, ofs, vecs, mid_):
+    '''distances along unit vectors vecs, shape (nrays, ndims), from
+    ofs back to where each ray enters, and on to where it leaves, the
+    box of sample points in a volume of the given shape'''
+    maxval = n.array( shape ) - 1
+    if not (n.all( ofs <= maxval + mid_ ) and n.all( ofs >= mid_ )):
+        raise ValueError("Offsets must be within bounds of data.")
+    max_cnr = n.where( vecs > 0, maxval, 0 ) + mid_
+    min_cnr = n.where( vecs < 0, maxval, 0 ) + mid_
+    absvec = n.abs( vecs )
+    # axes the ray runs parallel to never limit it
+    flat = absvec == 0
+    absvec[flat] = 1.
+    back = n.where( flat, n.inf, n.abs( min_cnr - ofs ) / absvec ).min(-1)
+    fwd = n.where( flat, n.inf, n.abs( max_cnr - ofs ) / absvec ).min(-1)
+    return back, fwd
+
+
+def extract_lines(data, ofs, vecs, mid=True, method='linear', nsamples=None):
+    '''extracts intensity values from a volume along many lines
+    at once
+
+    Usage: (vals, coords, offsets) = extract_lines(data, ofs, vecs)
+
+    Inputs:
+          data = volume to extract from
+          ofs = points on lines, shape (nlines, ndims)
+          vecs = directions of lines, shape (nlines, ndims)
+          method = interpolation method, as for ninterpol
+          nsamples = if given, resample each line at this many
+                     evenly spaced points from where it enters to
+                     where it leaves the volume
+    Outputs:
+          vals = returned values from volume
+          coords = co-ordinates of extracted points
+          offsets = line i is vals[offsets[i]:offsets[i+1]], and
+                    coords[:,offsets[i]:offsets[i+1]]
+
+    By default, as for extract_line, values are taken at unit length
+    intervals along each line, through ofs, and the result is ragged:
+    vals has shape (npts,) and coords (ndims, npts). If nsamples is
+    given, vals has shape (nlines, nsamples), coords has shape
+    (ndims, nlines, nsamples) and offsets is None.
+
+    All points are interpolated in a single call to ninterpol.'''
     if mid:
         mid_ = 0.5
     else:
         mid_ = 0.
-    maxval = n.array( data.shape ) - 1
-
-    # ensure inputs are numpy arrays
-    ofs = n.asarray( ofs )
-    vec = unitvec( vec )
-
-    if n.alltrue( ofs <= maxval + mid_ ) and n.alltrue( ofs >= mid_ ):
-        max_cnr = n.where(vec > 0, maxval, zeros(data.ndim)) + mid_
-        min_cnr = n.where(vec < 0, maxval, zeros(data.ndim)) + mid_
-        #print max_cnr
-        #print min_cnr
-
-        # work out how many steps before ofs
-        presteps = (n.abs( min_cnr - ofs ) / n.abs( vec ) \
-                    ).min().astype(int)
-
-        # ... and how many after ofs
-        poststeps = (n.abs( max_cnr - ofs ) / n.abs( vec ) \
-                     ).min().astype(int)
-
-        # construct list of steps ( in delta vecs )
-        if presteps > 0:
-            steps = [(presteps - i) * -1 \
-                     for i in range( presteps + 1)]
-                     # +1 to add 0 pt (at ofs)
-        else:
-            steps = [0]
-
-        if poststeps > 0:
-            steps += [(i + 1) for i in range( poststeps )]
-
-        steps = n.array(steps)[newaxis,...]
-
-        # construct array of actual pts
-        pts = ofs[...,newaxis] + steps * vec[...,newaxis]
-        #print pts
-        val = ninterpol( data, pts, mid=mid )
-        return val, pts
-        
+    ofs = n.atleast_2d( n.asarray( ofs, dtype=float ) )
+    vecs = unitvec( n.atleast_2d( n.asarray( vecs, dtype=float ) ) )
+    back, fwd = _ray_box_limits( data.shape, ofs, vecs, mid_ )
+
+    if nsamples is None:
+        presteps = back.astype(int)
+        counts = presteps + fwd.astype(int) + 1
+        offsets = n.concatenate( ([0], n.cumsum( counts )) )
+        line = n.repeat( n.arange( len( counts ) ), counts )
+        steps = n.arange( offsets[-1] ) - (offsets[:-1] + presteps)[line]
+        pts = (ofs[line] + steps[:,newaxis] * vecs[line]).T
     else:
-        raise ValueError("[extract_line] Offset must be within bounds of data.")
-        return None
+        offsets = None
+        frac = n.linspace( 0., 1., nsamples )
+        steps = -back[:,newaxis] + (back + fwd)[:,newaxis] * frac
+        pts = ofs.T[:,:,newaxis] + steps * vecs.T[:,:,newaxis]
+        # keep rounding at the ends from straying outside the volume
+        maxval = (n.array( data.shape ) - 1).reshape( (-1, 1, 1) )
+        n.clip( pts, mid_, maxval + mid_, out=pts )
+    vals = ninterpol( data, pts, method=method, mid=mid )
+    return vals, pts, offsets
 
 
 def ind2ax(ind, m):
@@ -231,12 +317,10 @@ def centre_of_mass(v):
 
     \dot{c} = \dfrac{\sum{w \cdot \dot{p}_{i}}}
                     {\sum{w}}
+
+    v may be a ChunkedVolume, which is read one slab at a time.
     '''
-    inds = n.indices(v.shape)
-    vp = inds * v[n.newaxis,...]
-    for i in range(n.rank(v)):
-        vp = vp.sum(-1)
-    return vp / v.sum()
+    return moments(v, order=1)[1]
 
 
 def align_stacks_big_by_com(a, b):
@@ -250,28 +334,139 @@ def align_stacks_big_by_com(a, b):
     return ga, gb
 
 
+class PaddedView(object):
+    '''read-only view of an array placed at offset lo within a
+    larger, virtual, volume of the given shape, filled elsewhere with
+    fill. Nothing is copied until the view is indexed, and then only
+    the part of the array that is asked for is read.
+
+    Usage: pv = PaddedView(arr, lo, shape)
+           pv[10:20, ...]   # ndarray, padded where outside arr
+           n.asarray(pv)    # whole padded volume'''
+
+    def __init__(self, arr, lo, shape, fill=0):
+        self.arr = arr
+        self.lo = tuple( [int(i) for i in lo] )
+        self.shape = tuple( [int(i) for i in shape] )
+        self.fill = fill
+        if len( self.lo ) != len( arr.shape ) or \
+                len( self.shape ) != len( arr.shape ):
+            raise ValueError("lo and shape must have one entry per " \
+                             "dimension of arr")
+
+    dtype = property(lambda self: self.arr.dtype)
+    ndim = property(lambda self: len(self.shape))
+
+    def __getitem__(self, key):
+        if not type(key) == tuple:
+            key = (key,)
+        if Ellipsis in key:
+            i = key.index(Ellipsis)
+            key = key[:i] + (slice(None),) * (self.ndim - len(key) + 1) \
+                + key[i + 1:]
+        key = key + (slice(None),) * (self.ndim - len(key))
+        outshape, dst, src, squeeze = [], [], [], []
+        empty = False
+        for ax, k in enumerate( key ):
+            if isinstance( k, slice ):
+                idx = n.arange( *k.indices( self.shape[ax] ) )
+            else:
+                k = int( k )
+                if k < 0:
+                    k += self.shape[ax]
+                idx = n.array( [k] )
+                squeeze.append( ax )
+            outshape.append( idx.size )
+            # positions in arr, which are evenly spaced, as are those
+            # which fall inside it
+            idx = idx - self.lo[ax]
+            inside = n.flatnonzero( (idx >= 0) & (idx < self.arr.shape[ax]) )
+            if inside.size == 0:
+                empty = True
+                continue
+            first, last = inside[0], inside[-1]
+            dst.append( slice( first, last + 1 ) )
+            step = int( idx[1] - idx[0] ) if idx.size > 1 else 1
+            stop = idx[last] + step
+            if stop < 0:
+                stop = None
+            src.append( slice( idx[first], stop, step ) )
+        out = n.empty( outshape, dtype=self.dtype )
+        out.fill( self.fill )
+        if not empty:
+            out[tuple(dst)] = self.arr[tuple(src)]
+        if squeeze:
+            out = out.reshape( [sz for ax, sz in enumerate( outshape ) \
+                                    if not ax in squeeze] )
+        return out
+
+    def __array__(self, dtype=None):
+        return n.asarray( self[...], dtype=dtype )
+
+
+def _placement(alc, ashape, blc, bshape):
+    '''integer offsets of a and b in a common volume in which
+    alc and blc coincide, the shape of that volume, and the
+    fractional part of the offset of b relative to that of a'''
+    alc = n.asarray( alc, dtype=float )
+    blc = n.asarray( blc, dtype=float )
+    acu = n.asarray( ashape ) - alc
+    bcu = n.asarray( bshape ) - blc
+
+    glc = n.vstack( (alc,blc) ).max(0)
+    gcu = n.vstack( (acu,bcu) ).max(0)
+    al = glc - alc
+    bl = glc - blc
+    ali, bli = n.floor( al ).astype(int), n.floor( bl ).astype(int)
+    shape = n.floor( glc + gcu ).astype(int)
+    return ali, bli, shape, (bl - bli) - (al - ali)
+
+
+def overlap_views(a, alc, b, blc):
+    '''returns views of the regions of a and b that overlap when
+    point alc of a is aligned with point blc of b (to the nearest
+    voxel below, as in align_stacks_big_by_offs); no data is copied
+
+    Usage: va, vb = overlap_views(a, alc, b, blc)
+    '''
+    al, bl, shape, frac = _placement( alc, a.shape, blc, b.shape )
+    lo = n.maximum( al, bl )
+    hi = n.minimum( al + n.asarray( a.shape ), bl + n.asarray( b.shape ) )
+    hi = n.maximum( hi, lo )
+    va = a[tuple( [slice(i, j) for i, j in zip( lo - al, hi - al )] )]
+    vb = b[tuple( [slice(i, j) for i, j in zip( lo - bl, hi - bl )] )]
+    return va, vb
+
+
+def align_stacks_by_offs(a, alc, b, blc, subvoxel=False, order=1):
+    '''aligns stacks a and b so that point alc of a coincides
+    with point blc of b, returning lazily zero-padded views
+    (PaddedView) of each over the union of the two
+
+    Usage: pa, pb = align_stacks_by_offs(a, alc, b, blc)
+
+    Offsets are truncated to whole voxels, and no data is copied,
+    unless subvoxel is True, in which case b is first resampled
+    (scipy.ndimage.shift, spline order) by the remaining fraction
+    of a voxel; dtypes are preserved'''
+    al, bl, shape, frac = _placement( alc, a.shape, blc, b.shape )
+    if subvoxel and n.any( frac != 0 ):
+        from scipy import ndimage
+        b = ndimage.shift( n.asarray( b ), frac, order=order, \
+                           output=n.dtype( b.dtype ) )
+    return PaddedView( a, al, shape ), PaddedView( b, bl, shape )
+
+
 def align_stacks_big_by_offs(a, alc, b, blc):
-    alc = n.asarray(alc)
-    blc = n.asarray(blc)
-    acu = n.asarray(a.shape) - alc
-    bcu = n.asarray(b.shape) - blc
+    '''zero pad stacks to give compatible regions, aligned so that
+    point alc of a coincides with point blc of b (to the nearest
+    voxel below)
 
-    glc = n.vstack((alc,blc)).max(0)
-    gcu = n.vstack((acu,bcu)).max(0)
+    Returns padded float64 copies; use align_stacks_by_offs or
+    overlap_views to avoid copying, and to keep the input dtypes.'''
+    ga, gb = align_stacks_by_offs( a, alc, b, blc )
+    return n.asarray( ga, dtype=float ), n.asarray( gb, dtype=float )
 
-    ga = n.zeros(glc+gcu)
-    gb = n.zeros(glc+gcu)
-    al = glc - alc
-    au = al + n.asarray(a.shape)
-    ga_slice = [ slice(i,j) for (i,j) in zip( al, au ) ]
-    bl = glc - blc
-    bu = bl + n.asarray(b.shape)
-    gb_slice = [ slice(i,j) for (i,j) in zip( bl, bu ) ]
-    ga[ga_slice] = a
-    gb[gb_slice] = b
-    
-    return ga, gb
-    
 
 
 class TestCoordhandlingFunctions(unittest.TestCase):
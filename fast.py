@@ -1,5 +1,4 @@
 import numpy as np
-from scipy import weave
 
 def histogram(values, bins=10, range=None):
     '''
@@ -28,9 +27,17 @@ def histogram(values, bins=10, range=None):
       description of the possible semantics.
     bin_edges : array of dtype float
       Return the bin edges ``(length(hist)+1)``.
+
+    Notes
+    -----
+    Bins are half-open, [left, right), except the last, which also includes
+    values equal to its right edge, as in numpy.histogram. Because `values`
+    is sorted, each bin edge is located with a binary search
+    (numpy.searchsorted), so the cost is O(nbins * log(nvalues)) rather than
+    a sweep over every value.
     '''
-    values = np.asarray(values)
-        
+    values = np.asarray(values).ravel()
+
     # define bins, size N
     if (range is not None):
         mn, mx = range
@@ -51,89 +58,155 @@ def histogram(values, bins=10, range=None):
         if (np.diff(bins) < 0).any():
             raise AttributeError(
                 'bins must increase monotonically.')
-    
-    # define n, empty array of size N+1
-    count = np.zeros(bins.size - 1, int)
-    nvalues = values.size
-    nbins = bins.size
 
     if values.size == 0:
         raise AttributeError(
             'a must contain some data')
-    
+
     if values[-1] < bins[0]:
         raise AttributeError(
             'last element of a must be smaller than first element of bins')
-    
-    code = \
-        '''
-    int lb, rb;
-
-    if (values(0) >= bins(0)) {
-        rb = 0;
-    } else {
-        lb = 0;
-        rb = nvalues + 1;
-        while(lb < rb - 1) {
-            if (values((lb + rb) / 2) < bins(0)) {
-                lb = (lb + rb) / 2;
-            } else {
-                rb = (lb + rb) / 2;
-            }
-        }
-    }
-
-    // Sweep through the values, counting, until they get too big
-    lb = 0;
-    while ((rb < nvalues) && (values(rb) < bins(nbins-1))) {
-        // Advance the edge caret until the current value is in the current bin
-        while (bins(lb+1) <= values(rb)) {
-            lb++;
-        }
-        // Increment the current bin
-        count(lb)++;
-        // Increment the value caret
-        rb++;
-    }
-    // Make last bin closed on RHS, i.e. include last value if equal
-    if (bins(nbins-1) == values(rb)) {
-        count(nbins-2)++;
-    }
+
+    return _sorted_counts(values, bins), bins
+
+def _sorted_counts(values, bins):
+    '''
+    Returns the number of sorted `values` in each bin defined by `bins`,
+    with the last bin closed on its right edge.
+    '''
+    edge_inds = np.empty(bins.size, dtype=int)
+    edge_inds[:-1] = np.searchsorted(values, bins[:-1], side='left')
+    # make last bin closed on RHS, i.e. include last values if equal
+    edge_inds[-1] = np.searchsorted(values, bins[-1], side='right')
+    return np.diff(edge_inds)
+
+class HistogramAccumulator(object):
+    '''
+    Histogram over fixed bins, built up from chunks of data, for data sets
+    too big to hold in memory at once.
+
+    Parameters
+    ----------
+    bins : int or sequence of scalars, optional
+      If `bins` is an int, it defines the number of equal-width bins in
+      `range`. If `bins` is a sequence, it defines the bin edges, including
+      the rightmost edge.
+    range : (float, float)
+      The lower and upper range of the bins; required if `bins` is an int,
+      since the edges cannot depend on data not seen yet.
+
+    Notes
+    -----
+    Bins follow the same rules as `histogram`: half-open, [left, right),
+    except for the last, which also includes values equal to its right edge.
+    Values outside the bins are ignored.
+
+    Accumulators with the same bins, e.g. returned from worker processes,
+    can be combined with `merge` or `+=`.
     '''
-    weave.inline(code, ['count', 'values', 'bins', 'nvalues', 'nbins'],
-                 type_converters=weave.converters.blitz)
-    return count, bins
 
-def indices3d(vol_size):
+    def __init__(self, bins=10, range=None):
+        if not np.iterable(bins):
+            if range is None:
+                raise ValueError('range must be given if bins is an int')
+            mn, mx = [mi+0.0 for mi in range]
+            if (mn > mx):
+                raise AttributeError(
+                    'max must be larger than min in range parameter.')
+            bins = np.linspace(mn, mx, bins+1, endpoint=True)
+        else:
+            bins = np.asarray(bins, dtype=float)
+            if (np.diff(bins) < 0).any():
+                raise AttributeError(
+                    'bins must increase monotonically.')
+        self.bins = bins
+        self.counts = np.zeros(bins.size - 1, dtype=int)
+
+    def add(self, values, weights=None, sorted=False):
+        '''
+        Add a chunk of values to the histogram.
+
+        Parameters
+        ----------
+        values : array_like
+          values to count; flattened
+        weights : array_like, optional
+          weight of each value, same shape as `values`; once any weights
+          have been added the counts become floats
+        sorted : bool, optional
+          `values` are already sorted in ascending order, so the bin edges
+          can be located in them by binary search, without a pass over
+          every value (unless weights are given)
+        '''
+        values = np.asarray(values).ravel()
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float).ravel()
+            if weights.shape != values.shape:
+                raise ValueError('weights must have the same shape as values')
+        if values.size == 0:
+            return
+        nbins = self.counts.size
+        if sorted:
+            if weights is None:
+                self.counts += _sorted_counts(values, self.bins)
+                return
+            edge_inds = np.empty(self.bins.size, dtype=int)
+            edge_inds[:-1] = np.searchsorted(values, self.bins[:-1], 'left')
+            edge_inds[-1] = np.searchsorted(values, self.bins[-1], 'right')
+            cumw = np.concatenate(([0.], np.cumsum(weights)))
+            self.counts = self.counts + np.diff(cumw[edge_inds])
+        else:
+            inds = np.searchsorted(self.bins, values, side='right') - 1
+            # make last bin closed on RHS
+            inds[values == self.bins[-1]] = nbins - 1
+            inside = (inds >= 0) & (inds < nbins)
+            if weights is not None:
+                weights = weights[inside]
+            self.counts = self.counts + \
+                np.bincount(inds[inside], weights=weights, minlength=nbins)
+
+    def merge(self, other):
+        '''
+        Add the counts of another accumulator with the same bins to this
+        one. Returns self.
+        '''
+        if not np.array_equal(self.bins, other.bins):
+            raise ValueError('can only merge histograms with the same bins')
+        self.counts = self.counts + other.counts
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def histogram(self):
+        '''Returns the counts and bin edges, as from `histogram`.'''
+        return self.counts, self.bins
+
+def indices3d(vol_size, sparse=False):
     '''Returns the equivalent of n.indices for 3-D only.
-    Gives a ~6x speed up.
+
+    Parameters
+    ----------
+    vol_size : sequence of 3 ints
+      shape of the volume
+    sparse : bool, optional
+      if True, return three broadcastable index arrays, of shapes (X,1,1),
+      (1,Y,1) and (1,1,Z), as given by numpy.ogrid, instead of the full
+      (3,X,Y,Z) array; these use O(X+Y+Z) memory and can be used in place
+      of the full array in any arithmetic that broadcasts
+
+    Notes
+    -----
+    The dense form fills a preallocated array by broadcasting each 1-d
+    range into it, and runs at about the speed of numpy.indices; use the
+    sparse form where possible.
     '''
-    xsz = vol_size[0]
-    ysz = vol_size[1]
-    zsz = vol_size[2]
     assert( len(vol_size) == 3 )
-    assert( type(xsz) == int )
-    assert( type(ysz) == int )
-    assert( type(zsz) == int )
-    code = '''
-    #line 14
-    int i,j,k;
-    npy_int dims[4] = {3,xsz,ysz,zsz};
-    long *curpos;
-    PyArrayObject* ar =
-      (PyArrayObject *)PyArray_ZEROS(4, &dims[0], NPY_LONG, 0);
-    for (i = 0; i<xsz; i++)
-        for (j = 0; j<ysz; j++)
-            for (k = 0; k<zsz; k++)
-            {
-                curpos = (long *)PyArray_GETPTR4(ar, 0, i, j, k);
-                *curpos = i;
-                curpos = (long *)PyArray_GETPTR4(ar, 1, i, j, k);
-                *curpos = j;
-                curpos = (long *)PyArray_GETPTR4(ar, 2, i, j, k);
-                *curpos = k;
-                
-            }
-    return_val = PyArray_Return(ar);
-    '''
-    return weave.inline( code, ['xsz','ysz','zsz'] ) 
+    xsz, ysz, zsz = [int(sz) for sz in vol_size]
+    if sparse:
+        return np.ogrid[0:xsz, 0:ysz, 0:zsz]
+    ar = np.empty((3, xsz, ysz, zsz), dtype=int)
+    ar[0] = np.arange(xsz)[:,None,None]
+    ar[1] = np.arange(ysz)[None,:,None]
+    ar[2] = np.arange(zsz)[None,None,:]
+    return ar
@@ -1,6 +1,9 @@
-from numpy import vstack, hstack, eye, ones, zeros, linalg, \
-newaxis, r_, flipud, convolve, matrix, array
-from scipy.signal import lfilter
+from numpy import vstack, hstack, eye, zeros, linalg, asarray, \
+newaxis, r_, concatenate, moveaxis, atleast_2d
+from scipy.signal import lfilter, sosfilt
+
+# zi for each (b, a) pair, and each set of second-order sections, seen so far
+_zi_cache = {}
 
 def lfilter_zi(b,a):
     #compute the zi state from the filter parameters. see [Gust96].
@@ -10,6 +13,17 @@ def lfilter_zi(b,a):
     # forward-backward filtering, IEEE Transactions on Signal Processing,
     # pp. 988--992, April 1996, Volume 44, Issue 4
 
+    #Results are memoized, since the same filter is usually applied to
+    #many signals. b and a must be the same length.
+    b = asarray(b, dtype=float)
+    a = asarray(a, dtype=float)
+    key = ('ba', b.tostring(), a.tostring())
+    if key in _zi_cache:
+        return _zi_cache[key].copy()
+
+    #normalize so that a[0] == 1
+    b = b / a[0]
+    a = a / a[0]
     n=max(len(a),len(b))
 
     zin = (  eye(n-1) - hstack( (-a[1:n,newaxis],
@@ -17,48 +31,98 @@ def lfilter_zi(b,a):
 
     zid=  b[1:n] - a[1:n]*b[0]
 
-    zi_matrix=linalg.inv(zin)*(matrix(zid).transpose())
-    zi_return=[]
+    zi = linalg.solve(zin, zid) if n > 1 else zeros(0)
+    _zi_cache[key] = zi
+    return zi.copy()
+
+
+def sosfilt_zi(sos):
+    #compute zi for each second-order section of a cascade (as from
+    #scipy.signal.butter(..., output='sos')), scaled for the step response
+    #of the sections before it; shape (n_sections, 2), memoized
+    sos = atleast_2d(asarray(sos, dtype=float))
+    key = ('sos', sos.tostring())
+    if key in _zi_cache:
+        return _zi_cache[key].copy()
+    zi = zeros((sos.shape[0], 2))
+    scale = 1.
+    for i, section in enumerate(sos):
+        b, a = section[:3], section[3:]
+        zi[i] = scale * lfilter_zi(b, a)
+        #dc gain of this section
+        scale *= b.sum() / a.sum()
+    _zi_cache[key] = zi
+    return zi.copy()
+
+
+def _odd_ext(x, padlen):
+    #extend x along its last axis with inverted replicas of its ends
+    if padlen == 0:
+        return x
+    left = 2*x[...,0:1] - x[...,padlen:0:-1]
+    right = 2*x[...,-1:] - x[...,-2:-padlen-2:-1]
+    return concatenate((left, x, right), axis=-1)
+
+
+def _forward_backward(filt, zi, x, axis, padlen):
+    #run filt(signal, zi) forwards then backwards along axis, over all
+    #other axes at once
+    x = moveaxis(asarray(x, dtype=float), axis, -1)
+    if x.shape[-1] <= padlen:
+        raise ValueError(
+            "Input needs to be longer than padlen (%d) along axis." % padlen)
+
+    #Grow the signal to have edges for stabilizing
+    #the filter with inverted replicas of the signal
+    s = _odd_ext(x, padlen)
 
-    #convert the result into a regular array (not a matrix)
-    for i in range(len(zi_matrix)):
-      zi_return.append(float(zi_matrix[i][0]))
+    y = filt(s, zi * s[...,:1])
+    y = filt(y[...,::-1], zi * y[...,-1:])[...,::-1]
 
-    return array(zi_return)
+    if padlen > 0:
+        y = y[...,padlen:-padlen]
+    return moveaxis(y, -1, axis)
 
 
-def filtfilt(b,a,x):
-    #For now only accepting 1d arrays
+def filtfilt(b,a,x,axis=-1,padlen=None):
+    #zero-phase filtering of x with the filter (b, a), along axis, of
+    #any number of dimensions; all other axes (e.g. channels) are
+    #filtered in the same lfilter call. The ends are padded by padlen
+    #(default 3 * max(len(a),len(b))) inverted replicas of the signal.
+    b = asarray(b, dtype=float)
+    a = asarray(a, dtype=float)
     ntaps=max(len(a),len(b))
-    edge=ntaps*3
-
-    if x.ndim != 1:
-        raise ValueError, "Filiflit is only accepting 1 dimension arrays."
-
-    #x must be bigger than edge
-    if x.size < edge:
-        raise ValueError, \
-              "Input vector needs to be bigger than 3 * max(len(a),len(b)."
+    if padlen is None:
+        padlen=ntaps*3
 
     if len(a) < ntaps:
-        a=r_[a,zeros(len(b)-len(a))]
+        a=r_[a,zeros(ntaps-len(a))]
 
     if len(b) < ntaps:
-        b=r_[b,zeros(len(a)-len(b))]
+        b=r_[b,zeros(ntaps-len(b))]
 
     zi=lfilter_zi(b,a)
 
-    #Grow the signal to have edges for stabilizing 
-    #the filter with inverted replicas of the signal
-    s=r_[2*x[0]-x[edge:1:-1],x,2*x[-1]-x[-1:-edge:-1]]
-    #in the case of one go we only need one of the extrems 
-    # both are needed for filtfilt
+    filt = lambda s, z : lfilter(b, a, s, -1, z)[0]
+    return _forward_backward(filt, zi, x, axis, padlen)
+
 
-    (y,zf)=lfilter(b,a,s,-1,zi*s[0])
+def sosfiltfilt(sos,x,axis=-1,padlen=None):
+    #as filtfilt, for a filter given as second-order sections (see
+    #scipy.signal.sosfilt), which stay stable at high orders where
+    #(b, a) lose precision. padlen defaults to 3 * (2 * n_sections + 1).
+    sos = atleast_2d(asarray(sos, dtype=float))
+    if padlen is None:
+        padlen = 3 * (2 * sos.shape[0] + 1)
 
-    (y,zf)=lfilter(b,a,flipud(y),-1,zi*y[-1])
+    zi = sosfilt_zi(sos)
 
-    return flipud(y[edge-1:-edge+1])
+    def filt(s, x0):
+        #sosfilt wants zi of shape (n_sections, ..., 2)
+        z = zi.reshape((zi.shape[0],) + (1,) * (s.ndim - 1) + (2,)) * \
+            x0[newaxis]
+        return sosfilt(sos, s, -1, z)[0]
+    return _forward_backward(filt, 1., x, axis, padlen)
 
 
 # if __name__=='__main__':
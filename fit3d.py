@@ -1,6 +1,7 @@
 from numpy import *
 from numpy import linalg
 from scipy.optimize import leastsq
+from moments import point_moments, principal_axes
 
 def fit_plane_resids( p, pts ):
     '''returns the residual (distances to the plane for the
@@ -59,13 +60,8 @@ def fitlineNdw(x,w):
     '''fits a line (vector D through pt a)
     to co-ordinates x with intensities w'''
 
-    N = x.shape[1]
-    a = ((x * w**2).mean(1)) * N / (w**2).sum()
-    y0 = w[:,newaxis] * (x.transpose() - a[newaxis,:])
-    y = y0[:,newaxis,:]
-    yt = y0[...,newaxis]
-    M = -1 * dotover(yt, y).sum(0)
-    M[arange( M.shape[0] ), arange( M.shape[1] )] += innerover( y0, y0 ).sum()
-    (ev, e) = linalg.eig( M )
-    D = e[:,where(ev == ev.min())].squeeze()
+    # the line runs through the centroid, along the principal axis of
+    # greatest spread, weighting by w**2
+    mass, a, S = point_moments(x, w**2)
+    D = principal_axes(S, mass)[1][:,0]
     return (a, D)
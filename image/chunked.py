@@ -0,0 +1,151 @@
+'''
+Chunked access to volumes too big to hold in memory.
+
+A ChunkedVolume wraps an array, usually a numpy.memmap of a raw file or a
+.npy file opened with mmap_mode, and divides it into slabs of whole planes
+along the first axis, which are contiguous on disk for C-ordered data.
+Indexing reads only the part of the file it needs; reductions and
+`map_slabs` work through the volume one slab at a time.
+'''
+
+import numpy as n
+
+# default maximum size of a slab
+_CHUNK_BYTES = 2**26
+
+class ChunkedVolume(object):
+    '''
+    Volume read, and reduced, in slabs along axis 0.
+
+    Parameters
+    ----------
+    data : array_like
+      the volume, typically a numpy.memmap
+    slab : int, optional
+      number of planes (along axis 0) per chunk; by default, as many as
+      fit in _CHUNK_BYTES
+    '''
+
+    def __init__(self, data, slab=None):
+        self.data = data
+        if slab is None:
+            plane = data.dtype.itemsize * int(n.prod(data.shape[1:]))
+            slab = _CHUNK_BYTES // max(plane, 1)
+        self.slab = max(int(slab), 1)
+
+    @classmethod
+    def from_raw(cls, filename, shape, dtype, offset=0, order='C',
+                 mode='r', slab=None):
+        '''Map a raw binary file, with a header of `offset` bytes, as a
+        volume of the given shape and dtype.'''
+        data = n.memmap(filename, dtype=dtype, mode=mode, offset=offset,
+                        shape=tuple(shape), order=order)
+        return cls(data, slab=slab)
+
+    @classmethod
+    def from_npy(cls, filename, mode='r', slab=None):
+        '''Map a .npy file.'''
+        return cls(n.load(filename, mmap_mode=mode), slab=slab)
+
+    # array-like behaviour ----------------------------------------------------
+
+    shape = property(lambda self: self.data.shape)
+    dtype = property(lambda self: self.data.dtype)
+    ndim = property(lambda self: len(self.data.shape))
+    size = property(lambda self: int(n.prod(self.data.shape)))
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, key):
+        return n.asarray(self.data[key])
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __array__(self, dtype=None):
+        # reads the whole volume
+        return n.asarray(self.data, dtype=dtype)
+
+    def __repr__(self):
+        return 'ChunkedVolume(shape=%s, dtype=%s, slab=%d)' % \
+            (str(self.shape), str(self.dtype), self.slab)
+
+    # chunk iteration ---------------------------------------------------------
+
+    def iter_chunks(self, step=1):
+        '''
+        Iterate over slabs of the volume.
+
+        Parameters
+        ----------
+        step : int, optional
+          make the size of every slab but the last a multiple of `step`
+          planes
+
+        Yields
+        ------
+        start : int
+          index along axis 0 of the first plane of the slab
+        block : ndarray
+          the slab
+        '''
+        slab = max(self.slab // step, 1) * step
+        for start in xrange(0, self.shape[0], slab):
+            yield start, n.asarray(self.data[start:start + slab])
+
+    def map_slabs(self, func, step=1):
+        '''Returns func applied to each slab (see `iter_chunks`) in turn,
+        with the results concatenated along axis 0.'''
+        return n.concatenate([func(block) for start, block in \
+                                  self.iter_chunks(step=step)], axis=0)
+
+    def reduce(self, ufunc, axis=None, dtype=None):
+        '''
+        Reduce the volume with a numpy ufunc (e.g. numpy.add), slab by slab.
+
+        Parameters
+        ----------
+        ufunc : numpy.ufunc
+          binary ufunc to reduce with
+        axis : int or None
+          axis to reduce along; None reduces over all axes
+        dtype : dtype, optional
+          accumulator type, as for ufunc.reduce
+        '''
+        if axis is not None and axis < 0:
+            axis += self.ndim
+        res = []
+        for start, block in self.iter_chunks():
+            if axis is None:
+                r = ufunc.reduce(block.ravel(), dtype=dtype)
+            else:
+                r = ufunc.reduce(block, axis=axis, dtype=dtype)
+            res.append(r)
+        if axis is not None and axis != 0:
+            # slabs give independent pieces of the result
+            return n.concatenate(res, axis=0)
+        return ufunc.reduce(n.asarray(res), axis=0)
+
+    def sum(self, axis=None, dtype=None):
+        return self.reduce(n.add, axis=axis, dtype=dtype)
+
+    def max(self, axis=None):
+        return self.reduce(n.maximum, axis=axis)
+
+    def min(self, axis=None):
+        return self.reduce(n.minimum, axis=axis)
+
+    def mean(self, axis=None):
+        if axis is None:
+            count = self.size
+        else:
+            count = self.shape[axis]
+        return self.sum(axis=axis, dtype=float) / count
+
+def iter_slabs(v, step=1):
+    '''Iterate over (start, block) slabs of `v`, as from
+    ChunkedVolume.iter_chunks; an ordinary array is a single slab.'''
+    if isinstance(v, ChunkedVolume):
+        return v.iter_chunks(step=step)
+    return iter([(0, n.asarray(v))])
@@ -0,0 +1,123 @@
+'''
+Slab-parallel execution of volume operations.
+
+A volume is split along its first (slowest) axis into slabs, and a task is
+run for each slab, either in a pool of threads, which suits the many
+NumPy/SciPy kernels that release the GIL, or in a pool of forked processes.
+Tasks write their results straight into their part of a preallocated output
+array, so nothing needs stitching together afterwards. For the process pool
+the output must be in shared memory; see `empty`.
+'''
+
+import numpy as n
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from multiprocessing.sharedctypes import RawArray
+
+def n_workers(workers):
+    '''Number of workers to use: None or 1 for serial execution, -1 for
+    one per CPU.'''
+    if workers is None:
+        return 1
+    if workers < 0:
+        return multiprocessing.cpu_count()
+    return max(int(workers), 1)
+
+def empty(shape, dtype=float, backend='thread'):
+    '''Returns an uninitialized array suitable for output from
+    `run_slabs` with the given backend: for 'process', it is backed by
+    shared memory, and so visible to forked workers.'''
+    if backend == 'process':
+        dtype = n.dtype(dtype)
+        size = int(n.prod(shape)) * dtype.itemsize
+        buf = RawArray('b', max(size, 1))
+        return n.frombuffer(buf, dtype=dtype,
+                            count=int(n.prod(shape))).reshape(shape)
+    return n.empty(shape, dtype=dtype)
+
+def slab_bounds(length, slab=None, workers=None):
+    '''Returns (start, stop) pairs splitting range(length) into slabs of
+    `slab` planes, or, by default, into about 4 slabs per worker.'''
+    if slab is None:
+        slab = -(-length // (4 * n_workers(workers)))
+    slab = max(int(slab), 1)
+    return [(i, min(i + slab, length)) for i in xrange(0, length, slab)]
+
+# task being run by a process pool; forked workers inherit it
+_process_task = None
+
+def _run_process_task(bounds):
+    return _process_task(*bounds)
+
+def run_slabs(task, length, slab=None, workers=None, backend='thread'):
+    '''
+    Calls task(start, stop) for slabs covering range(length).
+
+    Parameters
+    ----------
+    task : callable
+      takes the first and (exclusive) last plane of a slab; it should write
+      its output into a preallocated array rather than return it
+    length : int
+      number of planes
+    slab : int, optional
+      planes per slab; by default about 4 slabs per worker
+    workers : int, optional
+      None or 1 runs the slabs in turn in this thread; -1 uses one worker
+      per CPU
+    backend : 'thread' or 'process'
+      processes are forked, so task may be any callable, including a
+      closure, but only writes to shared memory (see `empty`) are seen by
+      the caller
+
+    Returns
+    -------
+    results : list
+      the return value of each task, in slab order
+    '''
+    global _process_task
+    nw = n_workers(workers)
+    bounds = slab_bounds(length, slab=slab, workers=workers)
+    if nw == 1 or len(bounds) == 1:
+        return [task(*b) for b in bounds]
+    if backend == 'thread':
+        pool = ThreadPool(nw)
+        try:
+            return pool.map(lambda b: task(*b), bounds, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    elif backend == 'process':
+        _process_task = task
+        pool = multiprocessing.Pool(nw)
+        try:
+            return pool.map(_run_process_task, bounds, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+            _process_task = None
+    else:
+        raise ValueError("backend must be 'thread' or 'process'")
+
+def filter_slabs(func, a, halo=0, out=None, slab=None, workers=None,
+                 backend='thread'):
+    '''
+    Applies a shape-preserving filter (e.g. a scipy.ndimage filter) to `a`
+    slab by slab, each slab padded with `halo` neighbouring planes on
+    either side (where they exist) so that the result matches func(a) for
+    filters reaching no further than `halo` planes along axis 0.
+
+    Returns out, which is allocated (see `empty`) with the dtype of
+    func's results if not given.
+    '''
+    length = a.shape[0]
+    if out is None:
+        probe = func(n.asarray(a[0:min(1 + 2 * halo, length)]))
+        out = empty(a.shape, dtype=probe.dtype, backend=backend)
+
+    def task(start, stop):
+        lo, hi = max(start - halo, 0), min(stop + halo, length)
+        res = func(n.asarray(a[lo:hi]))
+        out[start:stop] = res[start - lo:stop - lo]
+    run_slabs(task, length, slab=slab, workers=workers, backend=backend)
+    return out
@@ -8,6 +8,7 @@ from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg, \
      NavigationToolbar2WxAgg, FigureManager
 from matplotlib.figure import Figure
 from matplotlib.axes import Subplot
+from chunked import ChunkedVolume
 
 ID_FILE_EXIT         =   101
 ID_WINDOW_VIEWS      =   102
@@ -125,7 +126,7 @@ class DataFrame(wx.Frame):
 
 
     def ShapeString(self, id):
-        ndims = numpy.rank( self.parent.ims[id] )
+        ndims = self.parent.ims[id].ndim
         str = ''
         for i in range( ndims ):
             dimsize = self.parent.ims[id].shape[i]
@@ -372,10 +373,14 @@ class pyvis(wx.App):
     def AddImg(self, stack, name=None):
         '''Usage:  AddImg(data, name=name)
         Add an image (2 or 3-D) to PyVis stack, with an optional
-        name for reference.'''
+        name for reference. A ChunkedVolume is displayed a plane
+        at a time, stepping through its first axis (the one it is
+        chunked along, see _zaxis), so each plane is read from a
+        single chunk; its intensity range and projections are
+        computed slab by slab.'''
 
         # check we're dealing with a numpy array
-        if type(stack) == numpy.ndarray:
+        if type(stack) == numpy.ndarray or isinstance(stack, ChunkedVolume):
 
             self._pdbg(3, '->AddImg')
             # set appropriate data name
@@ -397,6 +402,15 @@ class pyvis(wx.App):
             pass
         
 
+    def _zaxis(self, data):
+        '''Axis of a 3-D stack that the z-slider steps through: the
+        last for arrays, the first (chunked) one for a ChunkedVolume,
+        since a plane across its chunks would read all of them.'''
+        if isinstance(data, ChunkedVolume):
+            return 0
+        return 2
+
+
     def UpdateImage(self, keepaxes=False):
         '''Internal usage mainly. Used to redraw the current image
         (2-D). Keepaxes is used when switching z-position to maintain
@@ -408,10 +422,12 @@ class pyvis(wx.App):
         data = self.ims[self.curname]
 
         # load data (plane if 3-D) into image
-        if numpy.rank(data) == 2:
-            self.im = data
-        elif numpy.rank(data) == 3:
-            self.im = data[:,:,self.zpos]
+        if data.ndim == 2:
+            self.im = data[:,:]
+        elif data.ndim == 3:
+            key = [slice(None)] * 3
+            key[self._zaxis(data)] = self.zpos
+            self.im = data[tuple(key)]
         else:
             raise TypeError("Data has too many dimensions")
 
@@ -450,13 +466,14 @@ class pyvis(wx.App):
             self.imax = data.max()
 
             # if 2-D set maximum z to be 0
-            if numpy.rank(data) == 2:
+            if data.ndim == 2:
                 zmax = 0
                 # if 3-D go to same (current) plane or max available
-            elif numpy.rank(data) == 3:
-                if self.zpos > data.shape[2]:
-                    self.zpos = data.shape[2] - 1
-                zmax = data.shape[2] - 1
+            elif data.ndim == 3:
+                nz = data.shape[self._zaxis(data)]
+                if self.zpos > nz:
+                    self.zpos = nz - 1
+                zmax = nz - 1
         
             # for later reference
             self.curname = name
@@ -472,7 +489,9 @@ class pyvis(wx.App):
             # is appropriate for new data
             keepaxes = False
             if not old_lims is None:
-                if numpy.all( numpy.array(old_lims).max(1) < data.shape[0:2] ):
+                xyshape = [sz for i, sz in enumerate(data.shape) \
+                               if data.ndim == 2 or i != self._zaxis(data)]
+                if numpy.all( numpy.array(old_lims).max(1) < xyshape ):
                     keepaxes = True
 
             # update the screen image
@@ -508,7 +527,8 @@ class pyvis(wx.App):
 
         Calculates a maximum z-projection of the data <name>
         and switches to make it the current data.'''
-        maxprojx = self.ims[name].max(2)
+        data = self.ims[name]
+        maxprojx = data.max(self._zaxis(data))
         self.AddImg(maxprojx, name + ' (max projection)')
 
 
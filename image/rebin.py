@@ -3,6 +3,11 @@
 import numpy as n
 import scipy.interpolate
 from scipy import ndimage
+from collections import OrderedDict
+import threading
+from chunked import ChunkedVolume, _CHUNK_BYTES
+from parallel import run_slabs, n_workers
+from amcmorl_py_tools.curves import fwhm2k, kerr2size
 
 def rebin_factor(a, scale_factor):
     '''wraps rebin_neighbour to allow a scale factor to be given'''
@@ -36,6 +41,54 @@ def neighbour_factor( a, newshape ):
     return a[slices]
 
 
+_REDUCTIONS = {'sum' : n.sum, 'mean' : n.mean, 'max' : n.max,
+               'min' : n.min, 'median' : n.median}
+
+def block_reduce(a, factors, how='mean', edge='exact', fill=0):
+    '''reduce each block of factors[0] x factors[1] x ... elements
+    of ndarray a to a single value
+
+    how: 'sum', 'mean', 'max', 'min', 'median', or a function taking
+         an array and a tuple of axes (e.g. n.std)
+    edge: what to do where a dimension is not a multiple of its factor
+      'exact' - raise a ValueError
+      'clip' - ignore the incomplete blocks at the high edge
+      'pad' - complete the blocks with value fill
+
+    Blocks are formed by reshaping a view of a, without copying
+    (except for edge='pad'), so for example
+    >>> block_reduce(n.arange(24).reshape(4,6), (2,3), 'max')
+    array([[ 8, 11],
+           [20, 23]])
+    '''
+    a = n.asarray(a)
+    factors = [int(f) for f in factors]
+    if len(factors) != a.ndim:
+        raise ValueError("need one factor per dimension of a")
+    func = _REDUCTIONS.get(how, how)
+    if not callable(func):
+        raise ValueError("unknown reduction %s" % (str(how)))
+    nblocks = [sz // f for sz, f in zip(a.shape, factors)]
+    if edge == 'pad':
+        nblocks = [-(-sz // f) for sz, f in zip(a.shape, factors)]
+        full = [nb * f for nb, f in zip(nblocks, factors)]
+        if full != list(a.shape):
+            padded = n.empty(full, dtype=n.result_type(a, fill))
+            padded.fill(fill)
+            padded[tuple([slice(0, sz) for sz in a.shape])] = a
+            a = padded
+    elif edge == 'clip':
+        a = a[tuple([slice(0, nb * f) for nb, f in zip(nblocks, factors)])]
+    elif edge == 'exact':
+        if n.any(n.mod(a.shape, factors)):
+            raise ValueError("shape %s is not a multiple of factors %s" % \
+                                 (str(a.shape), str(tuple(factors))))
+    else:
+        raise ValueError("edge must be 'exact', 'clip' or 'pad'")
+    blocked = a.reshape([i for pair in zip(nblocks, factors) for i in pair])
+    return func(blocked, axis=tuple(range(1, 2 * a.ndim, 2)))
+
+
 def rebin_average(a, *args):
     '''rebin ndarray data into a smaller ndarray of the same rank
     whose dimensions are factors of the original dimensions.
@@ -45,32 +98,133 @@ def rebin_average(a, *args):
     >>> a=rand(6,4); b=rebin(a,3,2)
     >>> a=rand(6); b=rebin(a,2)
     Returns averages of replaced elements.
+
+    a may be a ChunkedVolume, which is rebinned one slab at a time.
     '''
-    shape = a.shape
-    lenShape = len(shape)
-    assert len(args) == lenShape
-    evList = ['a.reshape('] + \
-             ['args[%d],shape[%d]/args[%d],'%(i,i,i) \
-              for i in range(lenShape)] \
-             + [')'] + ['.sum(%d)'%(i+1) for i in range(lenShape)] + \
-             ['*args[%d]/shape[%d]'%(i,i) for i in range(lenShape)]
-    return eval(''.join(evList))
+    if isinstance(a, ChunkedVolume):
+        factor = a.shape[0] / args[0]
+        return a.map_slabs(lambda b: rebin_average(b, b.shape[0] / factor,
+                                                   *args[1:]), step=factor)
+    assert len(args) == len(a.shape)
+    return block_reduce(a, n.asarray(a.shape) / n.asarray(args), 'mean')
 
 
 def rebin_mean(a, *args):
     '''returns a float array with values taken from the mean of the original
-    pixels'''
-    shape = a.shape
-    lenShape = len(shape)
-    factor = n.asarray(shape)/n.asarray(args)
-    evList = ['a.reshape('] + \
-             ['args[%d],factor[%d],'%(i,i) for i in range(lenShape)] + \
-             [')'] + ['.mean(%d)'%(i+1) for i in range(lenShape)]
-    print ''.join(evList)
-    return eval(''.join(evList))
-
-
-def congrid(a, newdims, method='linear', centre=False, minusone=False):
+    pixels
+
+    a may be a ChunkedVolume, which is rebinned one slab at a time.'''
+    if isinstance(a, ChunkedVolume):
+        factor = a.shape[0] / args[0]
+        return a.map_slabs(lambda b: rebin_mean(b, b.shape[0] / factor,
+                                                *args[1:]), step=factor)
+    return block_reduce(a, n.asarray(a.shape) / n.asarray(args), 'mean')
+
+
+# per-axis resampling tables, most recently used last; OrderedDict updates
+# aren't atomic, so all access goes through _table_lock
+_table_cache = OrderedDict()
+_TABLE_CACHE_SIZE = 128
+_table_lock = threading.Lock()
+
+def _congrid_coords(old, new, centre, minusone):
+    '''co-ordinates in the old axis of each point in the new one,
+    as chosen by IDL congrid'''
+    m1 = int(minusone)
+    ofs = int(centre) * 0.5
+    return float(old - m1) / (new - m1) * (n.arange(new) + ofs) - ofs
+
+def _resample_table(old, new, method, centre, minusone):
+    '''Returns the table for resampling one axis of length old to
+    length new: (indices,) for 'neighbour' and 'nearest', or
+    (lower indices, upper indices, upper weights) for 'linear'.
+    Tables are cached, since many arrays of the same shape are
+    often resampled in turn.'''
+    key = (old, new, method, bool(centre), bool(minusone))
+    with _table_lock:
+        table = _table_cache.pop(key, None)
+    if table is None:
+        x = n.clip(_congrid_coords(old, new, centre, minusone), 0, old - 1)
+        if method == 'neighbour':
+            table = (x.round().astype(int),)
+        elif method == 'nearest':
+            # round half down, like scipy.interpolate.interp1d
+            table = (n.ceil(x - 0.5).astype(int),)
+        else:
+            i0 = n.minimum(n.floor(x).astype(int), max(old - 2, 0))
+            table = (i0, n.minimum(i0 + 1, old - 1), x - i0)
+    with _table_lock:
+        # another thread may have put the same key back meanwhile
+        _table_cache.pop(key, None)
+        if len(_table_cache) >= _TABLE_CACHE_SIZE:
+            _table_cache.popitem(last=False)
+        _table_cache[key] = table
+    return table
+
+def resample(a, newdims, method='linear', centre=False, minusone=False,
+             workers=None):
+    '''Separable resampling of a to shape newdims, at the points
+    chosen by congrid (see there for centre and minusone).
+
+    method:
+    neighbour - closest value from original data (rounding halves
+                to even)
+    nearest - closest value from original data (rounding halves down)
+    linear - linear interpolation along each axis in turn
+
+    Each axis is resampled by a gather (and, for linear, a weighted
+    sum of two gathers) using a cached per-axis table. Points beyond
+    the ends of an axis take the value at the end.
+
+    workers - if given, the number of threads (-1 for one per CPU)
+              to share slabs of the output between'''
+    a = n.asarray(a)
+    if len(newdims) != a.ndim:
+        raise ValueError("newdims must have one entry per dimension of a")
+    if not method in ['neighbour', 'nearest', 'linear']:
+        raise ValueError("method must be 'neighbour', 'nearest' or 'linear'")
+    tables = [_resample_table(old, int(new), method, centre, minusone) \
+                  for old, new in zip(a.shape, newdims)]
+    if method == 'linear' and not a.dtype.kind in 'fc':
+        a = a.astype(float)
+    if workers is not None:
+        out = n.empty([int(new) for new in newdims], dtype=a.dtype)
+        def task(j0, j1):
+            out[j0:j1] = _resample_rows(a, tables, j0, j1)
+        run_slabs(task, out.shape[0], workers=workers)
+        return out
+    if method != 'linear':
+        return a[n.ix_(*[t[0] for t in tables])]
+    # do shrinking axes first, to keep intermediates small
+    order = n.argsort(n.asarray(newdims, dtype=float) / a.shape)
+    for ax in order:
+        a = _linear_pass(a, ax, *tables[ax])
+    return a
+
+def _resample_rows(a, tables, j0, j1):
+    '''Planes j0 to j1 of the result of resampling a with tables,
+    reading only the planes of a that they need.'''
+    if len(tables[0]) == 1:
+        return a[n.ix_(tables[0][0][j0:j1], *[t[0] for t in tables[1:]])]
+    i0, i1, w = tables[0]
+    lo, hi = i0[j0], i1[j1 - 1] + 1
+    res = _linear_pass(n.asarray(a[lo:hi]), 0, i0[j0:j1] - lo,
+                       i1[j0:j1] - lo, w[j0:j1])
+    for ax in range(1, a.ndim):
+        res = _linear_pass(res, ax, *tables[ax])
+    return res
+
+def _linear_pass(a, ax, i0, i1, w):
+    '''Linear interpolation along one axis of a, from a resampling
+    table.'''
+    shape = [1] * a.ndim
+    shape[ax] = w.size
+    w = w.astype(a.dtype).reshape(shape)
+    lower = a.take(i0, axis=ax)
+    return lower + (a.take(i1, axis=ax) - lower) * w
+
+def congrid(a, newdims, method='linear', centre=False, minusone=False,
+            workers=None):
     '''Arbitrary resampling of source array to new dimension sizes.
     Currently only supports maintaining the same number of dimensions.
     To use 1-D arrays, first promote them to shape (x,1).
@@ -81,8 +235,7 @@ def congrid(a, newdims, method='linear', centre=False, minusone=False):
 
     method:
     neighbour - closest value from original data
-    nearest and linear - uses n x 1-D interpolations using
-                         scipy.interpolate.interp1d
+    nearest and linear - uses n x 1-D interpolations (see resample)
     (see Numerical Recipes for validity of use of n 1-D interpolations)
     spline - uses ndimage.map_coordinates
 
@@ -95,12 +248,17 @@ def congrid(a, newdims, method='linear', centre=False, minusone=False):
     False - inarray is resampled by factors of (i/x) * (j/y)
     True - inarray is resampled by(i-1)/(x-1) * (j-1)/(y-1)
     This prevents extrapolation one element beyond bounds of input array.
+    Otherwise, for 'neighbour', 'nearest' and 'linear', points beyond the
+    last element take its value (interp1d, used previously, raised a
+    ValueError there, and 'neighbour' indexed out of range).
+
+    workers:
+    If given, the number of threads (-1 for one per CPU) to share
+    slabs of the output between.
     '''
     if not a.dtype in [n.float64, n.float32]:
         a = n.cast[float](a)
     
-    m1 = n.cast[int](minusone)
-    ofs = n.cast[int](centre) * 0.5
     old = n.array( a.shape )
     ndims = len( a.shape )
     if len( newdims ) != ndims:
@@ -109,62 +267,22 @@ def congrid(a, newdims, method='linear', centre=False, minusone=False):
               "rebinning to the same number of dimensions."
         return None
     newdims = n.asarray( newdims, dtype=float )    
-    dimlist = []
-
-    if method == 'neighbour':
-        for i in range( ndims ):
-            base = n.indices(newdims)[i]
-            dimlist.append( (old[i] - m1) / (newdims[i] - m1) \
-                            * (base + ofs) - ofs )
-        cd = n.array( dimlist ).round().astype(int)
-        newa = a[list( cd )]
-        return newa
-    
-    elif method in ['nearest','linear']:
-        # calculate new dims
-        for i in range( ndims ):
-            base = n.arange( newdims[i] )
-            dimlist.append( (old[i] - m1) / (newdims[i] - m1) \
-                            * (base + ofs) - ofs )
-        # specify old dims
-        olddims = [n.arange(i, dtype = n.float) for i in list( a.shape )]
-
-        # first interpolation - for ndims = any
-        mint = scipy.interpolate.interp1d( olddims[-1], a, kind=method )
-        newa = mint( dimlist[-1] )
-
-        trorder = [ndims - 1] + range( ndims - 1 )
-        for i in range( ndims - 2, -1, -1 ):
-            newa = newa.transpose( trorder )
-
-            mint = scipy.interpolate.interp1d( olddims[i], newa, kind=method )
-            newa = mint( dimlist[i] )
-
-        if ndims > 1:
-            # need one more transpose to return to original dimensions
-            newa = newa.transpose( trorder )
 
-        return newa
+    if method in ['neighbour', 'nearest', 'linear']:
+        return resample( a, newdims, method=method, centre=centre, \
+                         minusone=minusone, workers=workers )
     elif method in ['spline']:
-        oslices = [ slice(0,j) for j in old ]
-        oldcoords = n.ogrid[oslices]
-        nslices = [ slice(0,j) for j in list(newdims) ]
-        newcoords = n.mgrid[nslices]
-
-        newcoords_dims = range(n.rank(newcoords))
-        #make first index last
-        newcoords_dims.append(newcoords_dims.pop(0))
-        newcoords_tr = newcoords.transpose(newcoords_dims)
-        # makes a view that affects newcoords
-
-        newcoords_tr += ofs        
-
-        deltas = (n.asarray(old) - m1) / (newdims - m1)
-        newcoords_tr *= deltas
-
-        newcoords_tr -= ofs
-
-        newa = ndimage.map_coordinates(a, newcoords)
+        coords = [_congrid_coords(o, int(nw), centre, minusone) \
+                      for o, nw in zip(old, newdims)]
+        newa = n.empty( newdims.astype(int), dtype=a.dtype )
+        # prefilter once, not once per slab
+        coeffs = ndimage.spline_filter( a )
+        def task(j0, j1):
+            grid = n.meshgrid(coords[0][j0:j1], *coords[1:], indexing='ij')
+            newa[j0:j1] = ndimage.map_coordinates(coeffs, grid,
+                                                  prefilter=False)
+        slab = newa.shape[0] if n_workers( workers ) == 1 else None
+        run_slabs( task, newa.shape[0], slab=slab, workers=workers )
         return newa
     else:
         print "Congrid error: Unrecognized interpolation type.\n", \
@@ -174,46 +292,60 @@ def congrid(a, newdims, method='linear', centre=False, minusone=False):
 
 
 
-from gaussian import gauss3d
-from scipy import signal
-
-def rebin_arb(data, cur_px_res, des_px_res):
+def rebin_arb(data, cur_px_res, des_px_res, err=0.01, slab=None,
+              workers=None):
     '''blurs then resamples data to mimick
     rebinning over any arbitrary dimensions
 
     doesn''t really belong here, since it''s
-    application is too specific'''
-
-    orishape = data.shape
-    cur_px_res = array(cur_px_res)
-    des_px_res = array(des_px_res)
+    application is too specific
+
+    data is blurred with a gaussian of fwhm 2 * des_px_res, to allow
+    for correct Nyquist sampling, truncated where it falls below err
+    of its peak, and then linearly resampled (as congrid) to pixels
+    of size des_px_res. Outside data is taken as zero.
+
+    Both steps are separable and done slab by slab along the first
+    axis (slab output planes at a time), each slab read with enough
+    overlap for the blur, so data can be a ChunkedVolume and only
+    the output and one slab (per worker thread, if workers is given)
+    are held in memory.'''
+    orishape = n.array( data.shape )
+    cur_px_res = n.asarray( cur_px_res, dtype=float )
+    des_px_res = n.asarray( des_px_res, dtype=float )
 
-    # first make a gaussian kernel with fwhms
-    # 2 * des_px_res at cur_px_res spacing
-    # to allow for correct Nyquist sampling
     fwhms = des_px_res * 2 / cur_px_res
-    print "[rebin_arb] Creating kernel..."
-    kern = gauss3d( *fwhms )
-    # tick
-
-    # next blur data by that amount
-    print "[rebin_arb] Convolving data..."
-    blurred = signal.fftconvolve( data, kern )
-    # tick
-    
-    # and cut original size out of convolved data
-    # don't want to change volume size by resampling
-    # (except directly)
-    ofs = ((array(kern.shape) - 1)/2)
-    indstr = ', '.join([("ofs[%d]:-ofs[%d] - 1" % (i, i)) \
-                        for i in range( len( orishape ) )])
-    cblur = eval("blurred[" + indstr + "]")
-    # tick - okay see now I could have used 'same' switch to fftconvolve
-    
-    # next resample (using linear interpolation is now okay)
-    # at desired points in data
-    print "[rebin_arb] Resampling data..."
-    new_dims = (array( orishape ) * cur_px_res / des_px_res).round().astype(int)
-    smpl_cblur = congrid(cblur, new_dims)
-    
-    return (smpl_cblur, cblur, kern)
+    # curves.gauss1d is exp(-x**2 / k**2)
+    sigmas = fwhm2k( fwhms ) / n.sqrt( 2. )
+    radii = n.array( [int( kerr2size( fwhm2k( f ), err ) / 2. + 0.5 ) \
+                          for f in fwhms] )
+    # gaussian_filter1d rounds truncate * sigma to give the radius
+    truncate = (radii + 0.25) / sigmas
+
+    new_dims = (orishape * cur_px_res / des_px_res).round().astype(int)
+    tables = [_resample_table(old, new, 'linear', False, False) \
+                  for old, new in zip(orishape, new_dims)]
+    dtype = n.float32 if data.dtype == n.float32 else float
+    out = n.empty( new_dims, dtype=dtype )
+
+    if slab is None:
+        plane = n.dtype( dtype ).itemsize * int( n.prod( orishape[1:] ) )
+        slab = _CHUNK_BYTES // max( plane, 1 ) * new_dims[0] // orishape[0]
+        if workers is not None:
+            slab = min( slab, -(-new_dims[0] // (4 * n_workers( workers ))) )
+    i0s, i1s, ws = tables[0]
+
+    def task(j0, j1):
+        # input planes needed for these output planes, plus halo
+        lo, hi = i0s[j0], i1s[j1 - 1] + 1
+        blo, bhi = max( lo - radii[0], 0 ), min( hi + radii[0], orishape[0] )
+        blurred = n.array( data[blo:bhi], dtype=dtype )
+        for ax in range( len( orishape ) ):
+            ndimage.gaussian_filter1d( blurred, sigmas[ax], axis=ax, \
+                                       mode='constant', \
+                                       truncate=truncate[ax], output=blurred )
+        shifted = [(i0s - lo, i1s - lo, ws)] + tables[1:]
+        out[j0:j1] = _resample_rows( blurred[lo - blo:hi - blo], shifted, \
+                                     j0, j1 )
+    run_slabs( task, new_dims[0], slab=slab, workers=workers )
+    return out
@@ -0,0 +1,113 @@
+'''
+Mass, centroid and second moments of volumes and of weighted point sets.
+
+Volumes are reduced in one pass over slabs (see image.chunked), using only
+per-axis profiles and per-pair-of-axes projections of each slab, so no
+co-ordinate arrays the size of the volume are ever made.
+'''
+
+import numpy as n
+from amcmorl_py_tools.image.chunked import iter_slabs
+
+def _central(mass, m1, m2, origin):
+    '''Converts raw first and second moments, taken about origin, to the
+    centroid and second central moments.'''
+    c = m1 / mass
+    S = None
+    if m2 is not None:
+        S = m2 - mass * n.outer(c, c)
+    return c + origin, S
+
+def moments(v, order=2):
+    '''
+    Mass, centroid and second central moments of a volume.
+
+    Parameters
+    ----------
+    v : array_like or ChunkedVolume
+      intensities, treated as masses at integer co-ordinates; a
+      ChunkedVolume is read one slab at a time
+    order : int, optional
+      1 to skip the second moments
+
+    Returns
+    -------
+    mass : float
+      sum of v
+    centroid : ndarray
+      shape (ndim,), centre of mass
+    S : ndarray
+      shape (ndim, ndim), sum of v * (x - centroid)(x - centroid)^T, or
+      None if order is 1
+    '''
+    ndim = len(v.shape)
+    # accumulate about the middle of the volume to limit round-off
+    origin = (n.array(v.shape) - 1) / 2.
+    mass = 0.
+    m1 = n.zeros(ndim)
+    m2 = n.zeros((ndim, ndim)) if order > 1 else None
+    for start, block in iter_slabs(v):
+        pos = [n.arange(sz, dtype=float) - origin[i] \
+                   for i, sz in enumerate(block.shape)]
+        pos[0] += start
+        mass += block.sum(dtype=float)
+        for i in range(ndim):
+            others = tuple([k for k in range(ndim) if k != i])
+            prof = block.sum(axis=others, dtype=float)
+            m1[i] += n.dot(pos[i], prof)
+            if order > 1:
+                m2[i,i] += n.dot(pos[i]**2, prof)
+        if order > 1:
+            for i in range(ndim):
+                for j in range(i + 1, ndim):
+                    others = tuple([k for k in range(ndim) if k not in (i,j)])
+                    proj = block.sum(axis=others, dtype=float)
+                    m2[i,j] += n.dot(pos[i], n.dot(proj, pos[j]))
+                    m2[j,i] = m2[i,j]
+    centroid, S = _central(mass, m1, m2, origin)
+    return mass, centroid, S
+
+def point_moments(x, w=None):
+    '''
+    Mass, centroid and second central moments of weighted points.
+
+    Parameters
+    ----------
+    x : array_like
+      shape (ndim, npts), co-ordinates, e.g. from fit3d.vol2coords
+    w : array_like, optional
+      shape (npts,), weights; 1 by default
+
+    Returns
+    -------
+    mass, centroid, S : as for `moments`
+    '''
+    x = n.asarray(x, dtype=float)
+    if w is None:
+        w = n.ones(x.shape[1])
+    w = n.asarray(w, dtype=float)
+    mass = w.sum()
+    centroid = n.dot(x, w) / mass
+    y = x - centroid[:,n.newaxis]
+    S = n.dot(y * w, y.T)
+    return mass, centroid, S
+
+def inertia_tensor(S):
+    '''Inertia tensor corresponding to second central moments S, i.e.
+    trace(S) * I - S.'''
+    return n.trace(S) * n.eye(S.shape[0]) - S
+
+def principal_axes(S, mass=1.):
+    '''
+    Principal axes of second central moments S.
+
+    Returns
+    -------
+    variances : ndarray
+      shape (ndim,), variance along each axis (S / mass), largest first
+    axes : ndarray
+      shape (ndim, ndim), unit vector of each axis, in the columns
+    '''
+    var, axes = n.linalg.eigh(S / mass)
+    order = n.argsort(var)[::-1]
+    return var[order], axes[:,order]
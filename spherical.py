@@ -3,43 +3,7 @@ import numpy as np
 from warnings import warn
 warn("This module is deprecated. Use vecgeom package instead.")
 
-def cart2pol(array, axis=-1):
-    '''Convert an array containing xyz values into an array containing theta, phis
-
-    Parameters
-    ----------
-    array : array_like, shape (3,)
-      x,y,z components of vector, must be unit length for this to make sense
-
-    Returns
-    -------
-    theta : scalar
-    phi : scalar
-    '''
-    array = np.asarray(array)
-    if array.shape[axis] != 3:
-        raise(ValueError("size of dimension %d must be 3"  % (axis)))
-
-    return np.apply_along_axis(_cart2pol, axis, array)
-
-def pol2cart(array, axis=-1):
-    '''Convert a point described by two angles to Cartesian co-ordinates.
-
-    Parameters
-    ----------
-    array : array_like
-      theta, phi values (differentiated along `axis`, which must be length 2)
-      
-    Returns
-    -------
-    vector : array, shape (3,)
-      x,y,z co-ordinates of equivalent vector
-    '''
-    array = np.asarray(array)
-    if array.shape[axis] != 2:
-        raise(ValueError("size of dimension %d must be 2" % (axis)))
-
-    return np.apply_along_axis(_pol2cart, axis, array)
+from amcmorl_py_tools.vecgeom.coords import cart2pol, pol2cart
 
 def _pol2cart(tp):
     theta, phi = tp
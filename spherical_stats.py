@@ -4,11 +4,12 @@ import scipy.optimize as opt
 from amcmorl_py_tools.vecgeom import norm
 from amcmorl_py_tools.vecgeom.rotations import rotate_by_angles
 #from mayavi import mlab
-from scipy.integrate import quad
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 from warnings import warn
 from amcmorl_py_tools.vecgeom.coords import cart2pol, pol2cart
+from amcmorl_py_tools.vecgeom.stats import rbar2kappa, \
+    estimate_confid_angle_batch
 
 from warnings import warn
 warn("This module is deprecated. Use vecgeom package instead.")
@@ -560,7 +561,7 @@ def mean_dir(P_i):
     R, S = calc_R(P_i)
     return S/R
 
-def estimate_kappa(P_i, mu=None):
+def estimate_kappa(P_i, mu=None, method='powell'):
     '''Returns the maximum likelihood estimate of the spread parameter (kappa)
     of a von-Mises-Fisher distribution.
 
@@ -570,6 +571,10 @@ def estimate_kappa(P_i, mu=None):
         n unit vectors for which to find \kappa
       mu : array_like, shape (3,)
         vector of direction cosines for known population mean
+      method : string
+        'powell' minimises the estimating equation with
+        scipy.optimize.fmin_powell, 'newton' and 'table' invert it directly
+        (see `vecgeom.stats.rbar2kappa`)
 
     Returns
     -------
@@ -603,10 +608,12 @@ def estimate_kappa(P_i, mu=None):
     R, S = calc_R(P_i)
     #S = np.sum(P_i, axis=0)   # 3.2
     #R = np.sqrt(np.sum(S**2)) # 3.3
-    if mu != None:
+    if mu is not None:
         sample_mean = S/R
         C = np.dot(mu, sample_mean)
         R *= C
+    if method != 'powell':
+        return rbar2kappa(R / n, method=method)
     k0 = 1.
     lsq = opt.fmin_powell(to_min, k0, args=(R, n), disp=0)
     return lsq
@@ -616,79 +623,16 @@ def to_min(k, R, n):
     #print 'k %.8f R %.4f n %d -> %.8f' % (k, R, n, err)
     return err
 
-def C_F(kappa):
-    '''From Statistical Analysis of Spherical Data,
-    1987 by NI Fisher, T Lewis, and BJJ Embleton, equation 4.21'''
-    return kappa / (2 * np.pi * (np.exp(kappa) - np.exp(-kappa)))
+# log-space, so no overflow at large kappa, in vecgeom.stats
+from amcmorl_py_tools.vecgeom.stats import C_F, vmf_pde, vmf_pde_centered, \
+    vmf_logpdf_grid, vmf_pdf_grid, vmf_mixture_logpdf, vmf_mixture_pdf
 
-def vmf_pde(a, b, th, ph, k):
-    '''Returns the probability density estimate for the von-Mises-Fisher function, for the 3d case, at the angle (th, ph), with mean (a, b), and spread k.
+# closed forms, vectorized, in vecgeom.stats
+from amcmorl_py_tools.vecgeom.stats import vmf_cdf, vmf_sf, vmf_ppf, \
+    vmf_logpdf
 
-     Equation is taken from Statistical Analysis of Spherical Data, 1987 by NI Fisher, T Lewis, and BJJ Embleton, equation 4.23
-
-    Parameters
-    ----------
-    th : scalar
-      first angle for which to calculate h(theta)
-    ph : scalar
-      second angle for which to calculate h(theta)
-    a : scalar
-      first  mean angle
-    b : scalar
-      second mean angle
-    k : scalar
-      spread parameter
-    '''
-    sin, cos, pi, sinh = np.sin, np.cos, np.pi, np.sinh
-    return C_F(k) * np.exp(k * (sin(th) * sin(a) * cos(ph - b)
-                             + cos(th) * cos(a)))
-
-def vmf_pde_centered(th, k):
-    '''Returns the probability density function for the
-    von-Mises-Fisher function, for the 3d case, at the angle theta.
-
-    Equation is taken from Statistical Analysis of Spherical Data,
-    1987 by NI Fisher, T Lewis, and BJJ Embleton, equation 4.23
-
-    Parameters
-    ----------
-    theta : scalar
-      angle for which to calculate f(theta)
-    kappa : scalar
-      spread parameter
-    '''
-    return C_F(k) * np.exp(k * np.cos(th))
-
-def vmf_cdf(theta, kappa):
-    '''Returns the value of the cumulative density function of the
-    von-Mises-Fisher function, 3d case, at angle theta.'''
-    theta = np.asarray(theta)
-    if theta.size > 1:
-        if np.rank(theta) > 1:
-            raise ValueError("theta should be at most 1d.")
-        cdf_list = [quad(vmf_pdf, 0, angle, args=(kappa))[0] for angle in theta]
-        cdf = np.array(cdf_list)
-        return cdf
-    else:
-        intgr, abserr = quad(vmf_pdf, 0, theta, args=(kappa))
-        #print abserr
-        return intgr
-
-def vmf_rvs(mu, k, n_pts=1):
-    '''Simulate a  Fisher distribution. From Statistical Analysis of
-    Spherical Data, 1987, section 3.6.2'''
-    size = (n_pts, 2)
-    R = np.random.uniform(size=size)
-    R_0 = R[...,0]
-    R_1 = R[...,1]
-    l = np.exp(-2 * k)
-    colat = 2 * np.arcsin(np.sqrt(-np.log(R_0 * (1 - l) + l) / (2 * k)))
-    longit = 2 * np.pi * R_1
-    
-    pts = convert_polar_to_cartesian(colat, longit)
-    #print mean_dir(pts.T)
-    alpha, beta = convert_cartesian_to_polar(mu)
-    return rotate_by_angles(pts, alpha, beta).T
+# Cartesian, chunked and with explicit random state, in vecgeom.stats
+from amcmorl_py_tools.vecgeom.stats import vmf_rvs, vmf_rvs_batch
 
 #---------------------------------------------------------------------------
 # Stephens, 1962 Biometrika paper - derivation of table A.12 in Fisher, 1987
@@ -704,71 +648,13 @@ def binomial_coef(n,k):
 def lclip(a):
     return a if a >= 0 else 0
 
-def P(N, R):
-    '''from Stephens, 1962b, eqn 4'''
-    ss = np.arange(0, N / 2.)
-    rs = np.empty(ss.size)
-    for i, s in enumerate(ss):
-        rs[i] = (-1)**s * binomial_coef(N,s) * (lclip(N - R - 2 * s))**(N - 1)
-    result = rs.sum()
-    assert(~np.isnan(result))
-    return rs.sum()
-
-def calculate_R0(N, Rstar, alpha): #Ro_low, Ro_high):
-    Ro_low = 0
-    Ro_high = N
-    return opt.fminbound(prob_fn, Ro_low, Ro_high,
-                         args=(N, Rstar, alpha))#, disp=0)
-    #return gradient_descent(prob_fn, start=3*Rstar/4., args=(N, Rstar, alpha))
-
-def prob_fn(Ro, N, Rstar, alpha):
-    return (P(N, Ro) / P(N, Rstar) - alpha)**2
+# P and calculate_R0 are vectorized and cached in vecgeom.stats
+from amcmorl_py_tools.vecgeom.stats import P, log_P, calculate_R0, prob_fn
 #----------------------------------------------------------------------------
 
-def estimate_confid_angle(P_i, alpha, mu=None, verbose=False):
-    log = np.log
-    sqrt = np.sqrt
-    arccos = np.arccos
-    z = 2
-    n = P_i.shape[0]
-    R, S = calc_R(P_i)
-    if mu == None:
-        mu = S/R
-    #Rz = R * mu[z]
-    Rz = R
-    
-    khat = estimate_kappa(P_i, mu=mu)
-    #print "khat %3f" % (khat)
-    if khat < 5:
-        if n <= 30:
-            R0 = calculate_R0(n, Rz, alpha)
-            theta_alpha = arccos(R0 / R)
-        elif (n > 8) & (n < 30):
-            if (Rz > 0) & (Rz < n/4.):
-                Ra1 = sqrt(Rz**2 - 2 / 3. * n * log( alpha ))
-                theta_alpha = arccos(Ra1 / R)
-            elif (Rz >= n/4.) and (Rz <= 3 * n / 5.):
-                Ra1 = sqrt(Rz**2 - 2 / 3. * n * log( alpha ))
-                astar = alpha**(1 / (n - 1))
-                Ra2 = n * (1 - astar) + Rz * astar
-                Ra = (Ra1 + Ra2) / 2.
-                theta_alpha = arccos(Ra / R)
-            else: # Rz > 3n/5
-                assert (Rz > (3 * n / 5))
-                astar = alpha**(1 / (n - 1))
-                Ra2 = n * (1 - astar) + Rz * astar
-                theta_alpha = arccos(Ra2 / R)
-        else: # n > 30
-            if verbose: print "-",
-            assert(n >= 30)
-            # !!!!!!!!!!!!!!!!!!!!!!!!
-            theta_alpha = arccos(1 + log(alpha)/(khat * R))
-    else: # khat >= 5
-        if verbose: print "*",
-        # !!!!!!!!!!!!!!!!!!!!!!!!            
-        theta_alpha = arccos(1 - ((n - R) / R) *
-                             ((1 / alpha)**(1/float(n-1)) - 1))
-    return theta_alpha
+# Stephens' cone, and batched estimation, in vecgeom.stats
+from amcmorl_py_tools.vecgeom.stats import estimate_confid_angle, \
+    stephens_cone_angle
 
 def calc_confid_angle(P_i, alpha, mu=None):
     '''calculates the (1 - alpha) * 100% confidence interval for the given
@@ -792,7 +678,7 @@ def calc_confid_angle(P_i, alpha, mu=None):
 
     n = P_i.shape[0]
     R, S = calc_R(P_i)
-    if mu == None:
+    if mu is None:
         mu = S/R
     Rz = R * mu[z]
     # n <= 8 find R^0_{1-\alpha}
@@ -803,33 +689,8 @@ def calc_confid_angle(P_i, alpha, mu=None):
 
 # dispersion measurement -----------------------------------------------------
 
-def measure_percentile_angle_ex_kappa(kappa, percentile=0.95, n_pts=int(1e3)):
-    '''
-    Creates a random distribution with large `n` and dispersion `kappa`,
-    and finds the angle that encompasses `confid` * 100% of the pts. 
-    
-    Parameters
-    ----------
-    kappa : float
-        dispersion parameter of points
-    percentile : float
-        proportion of points to include inside angle
-    n_pts : int
-        number of points to create in distribution
-
-    Returns
-    -------
-    theta_percentile : float
-        angle that encompasses `percentile` * 100% of points `P_i`    
-    
-    Notes
-    -----
-    In this case I think theta_alpha does not depend on n, so it is best
-    to estimate with a large n for better accuracy.
-    '''
-    perpvec = np.array((0., 0., 1.))
-    P_i = vmf_rvs(perpvec, kappa, n_pts=n_pts)
-    return measure_percentile_angle(P_i, percentile=percentile)
+# with the analytic quantile (method='ppf'), in vecgeom.stats
+from amcmorl_py_tools.vecgeom.stats import measure_percentile_angle_ex_kappa
 
 def measure_percentile_angle(P_i, percentile=0.95):
     '''
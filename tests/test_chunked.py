@@ -0,0 +1,27 @@
+import os
+import tempfile
+import numpy as np
+from amcmorl_py_tools.image.chunked import ChunkedVolume
+from amcmorl_py_tools.coordhandling import centre_of_mass, extract_box
+
+def test_chunked_volume():
+    a = np.random.uniform(size=(13, 6, 5)).astype(np.float32)
+    fd, fname = tempfile.mkstemp(suffix='.npy')
+    os.close(fd)
+    try:
+        np.save(fname, a)
+        v = ChunkedVolume.from_npy(fname, slab=4)
+        assert v.shape == a.shape
+        assert len(list(v.iter_chunks())) == 4
+        assert [len(b) for s, b in v.iter_chunks(step=3)] == [3, 3, 3, 3, 1]
+        np.testing.assert_equal(v[2:5, 1, ::2], a[2:5, 1, ::2])
+        np.testing.assert_almost_equal(v.sum(), a.sum(), decimal=3)
+        for axis in [0, 1, 2]:
+            np.testing.assert_equal(v.max(axis), a.max(axis))
+            np.testing.assert_almost_equal(v.mean(axis), a.mean(axis))
+        np.testing.assert_almost_equal(centre_of_mass(v), centre_of_mass(a))
+        np.testing.assert_equal(extract_box(v, (6, 3, 2), (4, 2, 2)),
+                                extract_box(a, (6, 3, 2), (4, 2, 2)))
+        del v
+    finally:
+        os.remove(fname)
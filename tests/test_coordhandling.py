@@ -0,0 +1,125 @@
+import numpy as np
+from amcmorl_py_tools.coordhandling import ninterpol, extract_line, \
+    extract_lines, PaddedView, overlap_views, align_stacks_by_offs, \
+    align_stacks_big_by_offs, extract_box
+
+def test_ninterpol():
+    x = np.indices((6, 7, 8)).astype(float)
+    data = x[0] + 2 * x[1] - x[2]
+    pts = np.array([[0., 2.5, 5., 1.2],
+                    [0., 3.5, 6., 4.4],
+                    [0., 1.5, 7., 2.9]])
+    exp = pts[0] + 2 * pts[1] - pts[2]
+    np.testing.assert_almost_equal(ninterpol(data, pts), exp)
+    np.testing.assert_almost_equal(ninterpol(data, pts, method='cubic'), exp)
+    # first and last intervals of each axis, and the edges themselves
+    edge = np.array([[0.3, 4.6, 5., 0.],
+                     [0.9, 5.2, 0.4, 6.],
+                     [6.5, 0.1, 7., 0.]])
+    np.testing.assert_almost_equal(ninterpol(data, edge, method='cubic'),
+                                   edge[0] + 2 * edge[1] - edge[2])
+    # a single point, shape (ndims,), as in the documented usage
+    for method in ['linear', 'cubic']:
+        np.testing.assert_almost_equal(
+            ninterpol(data, np.array([2.3, 2.1, 3.4]), method=method),
+            2.3 + 2 * 2.1 - 3.4)
+    np.testing.assert_almost_equal(
+        ninterpol(data, np.array([0.2, 5.9, 7.]), method='cubic'),
+        0.2 + 2 * 5.9 - 7.)
+    q = x[0]**2 - x[1] * x[2]
+    np.testing.assert_almost_equal(ninterpol(q, x, method='cubic'), q)
+    out = np.empty(4)
+    ninterpol(data, pts + 0.5, mid=True, out=out)
+    np.testing.assert_almost_equal(out, exp)
+    # halves round down
+    np.testing.assert_equal(ninterpol(data, pts, method='nearest'),
+                            data[[0, 2, 5, 1], [0, 3, 6, 4], [0, 1, 7, 3]])
+
+def test_extract_lines():
+    # linear data, so interpolated values are known in closed form
+    x = np.indices((6, 7, 8)).astype(float)
+    data = x[0] + 2 * x[1] - x[2]
+    f = lambda p: (p[0] - 0.5) + 2 * (p[1] - 0.5) - (p[2] - 0.5) # mid=True
+    lo, hi = 0.5, np.array([5.5, 6.5, 7.5])[:,None]
+    inside = lambda p: np.all((p >= lo - 1e-9) & (p <= hi + 1e-9), axis=0)
+    ofs = np.array([[3., 3., 3.], [1., 5., 2.], [4.5, 2., 6.]])
+    vecs = np.array([[0.5, 0.5, 0.2], [0., 1., 0.], [-1., 0.3, 0.]])
+    units = vecs / np.sqrt((vecs**2).sum(axis=1))[:,None]
+    vals, pts, offsets = extract_lines(data, ofs, vecs)
+    assert offsets.shape == (4,)
+    np.testing.assert_almost_equal(vals, f(pts))
+    assert inside(pts).all()
+    for i in range(3):
+        p = pts[:,offsets[i]:offsets[i+1]]
+        # unit steps along the line, through ofs, as far as the volume goes
+        np.testing.assert_almost_equal(np.diff(p, axis=1),
+                                       np.repeat(units[i][:,None],
+                                                 p.shape[1] - 1, axis=1))
+        assert np.any(np.all(np.abs(p.T - ofs[i]) < 1e-9, axis=1))
+        assert not inside(p[:,:1] - units[i][:,None])
+        assert not inside(p[:,-1:] + units[i][:,None])
+        v, q = extract_line(data, ofs[i], vecs[i])
+        np.testing.assert_almost_equal(q, p)
+    vals, pts, offsets = extract_lines(data, ofs, vecs, nsamples=5)
+    assert vals.shape == (3, 5)
+    assert pts.shape == (3, 3, 5)
+    assert offsets is None
+    np.testing.assert_almost_equal(vals, f(pts))
+    for i in range(3):
+        p = pts[:,i]
+        # evenly spaced along the line, from face to face of the volume
+        steps = np.diff(p, axis=1)
+        np.testing.assert_almost_equal(steps, steps[:,:1] * np.ones((1, 4)))
+        np.testing.assert_almost_equal(np.cross(steps[:,0], units[i]), 0)
+        for end in [p[:,0], p[:,-1]]:
+            assert np.any(np.isclose(end, lo) | np.isclose(end, hi[:,0]))
+
+def test_padded_view():
+    a = np.arange(5 * 6 * 7, dtype=np.int16).reshape(5, 6, 7)
+    pv = PaddedView(a, (2, -1, 3), (9, 6, 12))
+    exp = np.zeros((9, 6, 12), dtype=np.int16)
+    exp[2:7, 0:5, 3:10] = a[:,1:,:]
+    np.testing.assert_equal(np.asarray(pv), exp)
+    assert np.asarray(pv).dtype == np.int16
+    for key in [(slice(None, None, -1),), (Ellipsis, 4), (0, 0, 0),
+                (3, slice(1, 5, 2), slice(11, None, -3)),
+                (-1, Ellipsis, slice(2, 9))]:
+        np.testing.assert_equal(pv[key], exp[key])
+
+def test_align_stacks():
+    a = np.ones((11, 15), dtype=np.uint8)
+    b = np.random.uniform(size=(15, 21))
+    ga, gb = align_stacks_big_by_offs(a, (5, 7), b, (7, 5.2))
+    assert ga.shape == gb.shape == (15, 22)
+    # legacy copies are float64, whatever the inputs
+    assert ga.dtype == gb.dtype == np.float64
+    np.testing.assert_equal(ga[2:13, :15], a)
+    np.testing.assert_equal(gb[:, 1:], b)
+    va, vb = overlap_views(a, (5, 7), b, (7, 5.2))
+    assert np.may_share_memory(va, a) and np.may_share_memory(vb, b)
+    assert va.dtype == np.uint8
+    np.testing.assert_equal(vb, b[2:13, 0:14])
+    np.testing.assert_equal(va, a[:, 1:15])
+    # sub-voxel: a half voxel shift interpolates between neighbours
+    pa, pb = align_stacks_by_offs(a, (5, 7), b, (7.5, 5.), subvoxel=True)
+    assert np.asarray(pa).dtype == np.uint8
+    np.testing.assert_almost_equal(pb[0:14, 2:23],
+                                   (b[:14] + b[1:]) / 2.)
+
+def test_extract_box():
+    d = np.arange(10 * 12).reshape(10, 12)
+    np.testing.assert_equal(extract_box(d, (5, 6), (3, 4)), d[4:7, 4:8])
+    # clipped at the edges, or padded
+    np.testing.assert_equal(extract_box(d, (0, 11), (3, 4)), d[0:2, 9:12])
+    box = extract_box(d, (0, 11), (3, 4), pad=-1)
+    np.testing.assert_equal(box[1:, :3], d[0:2, 9:12])
+    assert (box[0] == -1).all() and (box[:,3] == -1).all()
+
+def bench_ninterpol(npts=200):
+    '''Time ninterpol on `npts` points in a 64**3 volume.'''
+    from time import time
+    data = np.random.rand(64, 64, 64)
+    pts = np.random.uniform(0, 63, size=(3, npts))
+    t0 = time()
+    ninterpol(data, pts)
+    print "ninterpol: %.4fs for %d points" % (time() - t0, npts)
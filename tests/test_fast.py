@@ -0,0 +1,69 @@
+import numpy as np
+from amcmorl_py_tools import fast
+
+def test_histogram():
+    values = np.sort(np.random.uniform(-1, 11, size=1000))
+    values = np.r_[values, 10., 10.]
+    values.sort()
+    bins = np.arange(11.)
+    count, edges = fast.histogram(values, bins=bins)
+    np.testing.assert_equal(count, np.histogram(values, bins=bins)[0])
+    count, edges = fast.histogram(values, bins=7, range=(0, 10))
+    np_count, np_edges = np.histogram(values, bins=7, range=(0, 10))
+    np.testing.assert_equal(count, np_count)
+    np.testing.assert_almost_equal(edges, np_edges)
+
+def test_indices3d():
+    shape = (4, 5, 6)
+    np.testing.assert_equal(fast.indices3d(shape), np.indices(shape))
+    x, y, z = fast.indices3d(shape, sparse=True)
+    np.testing.assert_equal(np.array(np.broadcast_arrays(x, y, z)),
+                            np.indices(shape))
+
+def test_histogram_accumulator():
+    values = np.r_[np.random.uniform(-1, 11, size=1000), 10., 10., 0.]
+    weights = np.random.uniform(size=values.size)
+    bins = np.arange(11.)
+    np_count = np.histogram(values, bins=bins)[0]
+    np_wcount = np.histogram(values, bins=bins, weights=weights)[0]
+
+    acc = fast.HistogramAccumulator(bins)
+    for chunk in np.array_split(values, 7):
+        acc.add(chunk)
+    np.testing.assert_equal(acc.counts, np_count)
+
+    # sorted chunks, and merging partial results
+    acc_a = fast.HistogramAccumulator(10, range=(0, 10))
+    acc_b = fast.HistogramAccumulator(10, range=(0, 10))
+    halves = np.array_split(values, 2)
+    acc_a.add(np.sort(halves[0]), sorted=True)
+    acc_b.add(np.sort(halves[1]), sorted=True)
+    acc_a += acc_b
+    np.testing.assert_equal(acc_a.counts, np_count)
+
+    # weights, sorted and unsorted
+    acc = fast.HistogramAccumulator(bins)
+    order = np.argsort(values[:500])
+    acc.add(values[:500][order], weights=weights[:500][order], sorted=True)
+    acc.add(values[500:], weights=weights[500:])
+    np.testing.assert_almost_equal(acc.counts, np_wcount)
+
+def bench_fast(n=int(1e7)):
+    '''Compare fast.histogram and fast.indices3d against numpy.histogram
+    and numpy.indices on `n`-element inputs.'''
+    from time import time
+    values = np.sort(np.random.normal(size=n))
+    t0 = time()
+    fast.histogram(values, bins=100)
+    t1 = time()
+    np.histogram(values, bins=100)
+    t2 = time()
+    print "histogram: %.3fs fast, %.3fs numpy" % (t1 - t0, t2 - t1)
+    side = int(round(n**(1/3.)))
+    shape = (side, side, side)
+    t0 = time()
+    fast.indices3d(shape)
+    t1 = time()
+    np.indices(shape)
+    t2 = time()
+    print "indices3d: %.3fs fast, %.3fs numpy" % (t1 - t0, t2 - t1)
@@ -0,0 +1,19 @@
+import numpy as np
+from scipy import signal
+from amcmorl_py_tools.filtfilt import filtfilt, sosfiltfilt, lfilter_zi
+
+def test_filtfilt():
+    b, a = signal.butter(3, 0.05)
+    x = np.random.normal(size=(8, 500))
+    y = filtfilt(b, a, x)
+    np.testing.assert_almost_equal(y, signal.filtfilt(b, a, x, padlen=12))
+    np.testing.assert_almost_equal(filtfilt(b, a, x.T, axis=0), y.T)
+    np.testing.assert_almost_equal(filtfilt(b, a, x[3], padlen=30),
+                                   signal.filtfilt(b, a, x[3], padlen=30))
+    np.testing.assert_almost_equal(lfilter_zi(b, a), signal.lfilter_zi(b, a))
+
+def test_sosfiltfilt():
+    sos = signal.butter(8, 0.05, output='sos')
+    x = np.random.normal(size=(3, 500, 2))
+    np.testing.assert_almost_equal(sosfiltfilt(sos, x, axis=1),
+        signal.sosfiltfilt(sos, x, axis=1, padlen=27))
@@ -0,0 +1,27 @@
+import numpy as np
+from amcmorl_py_tools.moments import moments, point_moments, principal_axes
+from amcmorl_py_tools.image.chunked import ChunkedVolume
+
+def test_moments():
+    v = np.random.uniform(size=(9, 7, 8))**4
+    x = np.indices(v.shape).reshape(3, -1)
+    mass, c, S = moments(v)
+    exp_c = np.dot(x, v.ravel()) / v.sum()
+    y = x - exp_c[:,None]
+    np.testing.assert_almost_equal(mass, v.sum())
+    np.testing.assert_almost_equal(c, exp_c)
+    np.testing.assert_almost_equal(S, np.dot(y * v.ravel(), y.T))
+    for got, exp in zip(moments(ChunkedVolume(v, slab=2)), (mass, c, S)):
+        np.testing.assert_almost_equal(got, exp)
+    for got, exp in zip(point_moments(x, v.ravel()), (mass, c, S)):
+        np.testing.assert_almost_equal(got, exp)
+
+def test_principal_axes():
+    # a rod along (1,1,0)
+    v = np.zeros((10, 10, 10))
+    v[range(10), range(10), 5] = 1.
+    mass, c, S = moments(v)
+    var, axes = principal_axes(S, mass)
+    np.testing.assert_almost_equal(np.abs(axes[:,0]),
+                                   np.array([1, 1, 0]) / np.sqrt(2))
+    np.testing.assert_almost_equal(var[1:], 0)
@@ -0,0 +1,25 @@
+import numpy as np
+from scipy import ndimage
+from amcmorl_py_tools.image.parallel import run_slabs, filter_slabs, \
+    slab_bounds, empty
+
+def test_slab_bounds():
+    assert slab_bounds(10, slab=4) == [(0, 4), (4, 8), (8, 10)]
+    assert len(slab_bounds(100, workers=2)) == 8
+
+def test_run_slabs():
+    for backend in ['thread', 'process']:
+        out = empty((17, 5), dtype=int, backend=backend)
+        def task(start, stop):
+            out[start:stop] = np.arange(start, stop)[:,None]
+            return start
+        starts = run_slabs(task, 17, slab=3, workers=3, backend=backend)
+        assert starts == range(0, 17, 3)
+        np.testing.assert_equal(out, np.arange(17)[:,None] * np.ones(5))
+
+def test_filter_slabs():
+    a = np.random.uniform(size=(30, 20, 10))
+    f = lambda b: ndimage.gaussian_filter(b, 1.5, truncate=3.)
+    for backend in ['thread', 'process']:
+        res = filter_slabs(f, a, halo=5, slab=4, workers=2, backend=backend)
+        np.testing.assert_almost_equal(res, f(a))
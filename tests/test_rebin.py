@@ -0,0 +1,91 @@
+import numpy as np
+from amcmorl_py_tools.image.rebin import block_reduce, rebin_mean, congrid, \
+    rebin_arb, resample
+from amcmorl_py_tools.image.chunked import ChunkedVolume
+
+def test_block_reduce():
+    a = np.arange(24).reshape(4, 6)
+    np.testing.assert_equal(block_reduce(a, (2, 3), 'max'),
+                            np.array([[8, 11], [20, 23]]))
+    np.testing.assert_equal(block_reduce(np.arange(7.), (3,), 'sum',
+                                         edge='clip'), [3., 12.])
+    np.testing.assert_equal(block_reduce(np.arange(7.), (3,), 'sum',
+                                         edge='pad'), [3., 12., 6.])
+    b = np.random.uniform(size=(6, 8, 10))
+    np.testing.assert_almost_equal(rebin_mean(b, 3, 2, 5),
+        b.reshape(3, 2, 2, 4, 5, 2).mean(5).mean(3).mean(1))
+    np.testing.assert_almost_equal(
+        rebin_mean(ChunkedVolume(b, slab=3), 3, 2, 5), rebin_mean(b, 3, 2, 5))
+
+def test_resample():
+    a = np.arange(5.)
+    # upsampling puts points past the end, which take the end value
+    np.testing.assert_almost_equal(resample(a, (10,)),
+                                   [0, .5, 1, 1.5, 2, 2.5, 3, 3.5, 4, 4])
+    np.testing.assert_equal(resample(a, (10,), 'nearest'),
+                            [0, 0, 1, 1, 2, 2, 3, 3, 4, 4])
+    np.testing.assert_equal(resample(a, (4,), 'nearest', centre=True),
+                            [0, 1, 3, 4])
+    np.testing.assert_equal(resample(a, (10,), 'neighbour', centre=True),
+                            [0, 0, 1, 1, 2, 2, 3, 3, 4, 4])
+    np.testing.assert_almost_equal(resample(a, (9,), minusone=True),
+                                   np.arange(9) / 2.)
+    # separable: resampling each axis matches resampling them together
+    b = np.random.uniform(size=(6, 7, 8))
+    res = resample(b, (4, 9, 5))
+    step = resample(resample(resample(b, (4, 7, 8)), (4, 9, 8)), (4, 9, 5))
+    np.testing.assert_almost_equal(res, step)
+    np.testing.assert_almost_equal(resample(b, (4, 9, 5), workers=2), res)
+    # integer data keeps its dtype where no interpolation is done
+    assert resample(np.arange(6), (3,), 'nearest').dtype == np.arange(6).dtype
+
+def test_resample_threads():
+    # the table cache is shared, and overflows here, between threads
+    import threading
+    from amcmorl_py_tools.image import rebin
+    a = np.arange(20.)
+    errors = []
+    def work(offset):
+        try:
+            for size in range(offset, offset + 60):
+                np.testing.assert_almost_equal(resample(a, (size,),
+                    minusone=True), np.linspace(0, 19, size))
+        except Exception, e:
+            errors.append(e)
+    threads = [threading.Thread(target=work, args=(2 + 20 * i,))
+               for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(rebin._table_cache) <= rebin._TABLE_CACHE_SIZE
+
+def test_congrid():
+    x = np.indices((20, 30)).astype(float)
+    a = 2 * x[0] - x[1]
+    # linear function is reproduced exactly at congrid's points
+    for centre, minusone in [(False, False), (False, True), (True, False)]:
+        res = congrid(a, (10, 7), centre=centre, minusone=minusone)
+        c0 = (20. - minusone) / (10 - minusone) * \
+            (np.arange(10) + 0.5 * centre) - 0.5 * centre
+        c1 = (30. - minusone) / (7 - minusone) * \
+            (np.arange(7) + 0.5 * centre) - 0.5 * centre
+        c0, c1 = np.clip(c0, 0, 19), np.clip(c1, 0, 29)
+        np.testing.assert_almost_equal(res, 2 * c0[:,None] - c1[None,:])
+    np.testing.assert_equal(congrid(a, (10, 15), 'neighbour'), a[::2, ::2])
+    for method in ['neighbour', 'linear', 'spline']:
+        np.testing.assert_almost_equal(congrid(a, (13, 41), method, workers=3),
+                                       congrid(a, (13, 41), method))
+
+def test_rebin_arb():
+    d = np.random.uniform(size=(40, 30, 20))
+    res = rebin_arb(d, (1, 1, 1), (2.5, 2, 3))
+    assert res.shape == (16, 15, 7)
+    np.testing.assert_almost_equal(
+        rebin_arb(ChunkedVolume(d), (1, 1, 1), (2.5, 2, 3), slab=3), res)
+    np.testing.assert_almost_equal(
+        rebin_arb(d, (1, 1, 1), (2.5, 2, 3), workers=2), res)
+    # blurring preserves the level of a constant away from the edges
+    res = rebin_arb(np.ones((40, 30, 20)), (1, 1, 1), (2, 2, 2))
+    np.testing.assert_almost_equal(res[8:12, 6:9, 4:6], 1.)
@@ -1,5 +1,5 @@
 import numpy as np
-from spherical import pol2cart, cart2pol
+from spherical import pol2cart, cart2pol, _pol2cart, _cart2pol
 from vectors import norm
 
 def test_cart2pol():
@@ -33,3 +33,46 @@ def test_pol2cart_cart2pol():
     v = np.random.random(size=(2, 3))
     v /= norm(v, axis=1)[...,None]
     np.testing.assert_almost_equal(v, pol2cart(cart2pol(v)))
+
+def test_cart2pol_vectorized():
+    v = np.random.normal(size=(4, 3, 5))
+    v /= norm(v, axis=1)[:,None]
+    v[0,:,0] = [0., 0., 1.]
+    exp = np.apply_along_axis(_cart2pol, 1, v)
+    np.testing.assert_equal(cart2pol(v, axis=1), exp)
+    out = np.empty((4, 2, 5))
+    res = cart2pol(v, axis=1, out=out)
+    assert res is out
+    np.testing.assert_equal(out, exp)
+    np.testing.assert_equal(cart2pol(v.astype(np.float32), axis=1).dtype,
+                            np.float32)
+
+def test_pol2cart_vectorized():
+    tp = np.random.uniform(size=(5, 2, 4))
+    exp = np.apply_along_axis(_pol2cart, 1, tp)
+    np.testing.assert_almost_equal(pol2cart(tp, axis=1), exp)
+    np.testing.assert_equal(pol2cart(tp.astype(np.float32), axis=1).dtype,
+                            np.float32)
+
+def bench_cart2pol(n=int(1e6)):
+    '''Compare vectorized cart2pol and pol2cart against the
+    apply_along_axis versions on `n` vectors.
+
+    On 1e6 vectors (numpy 1.16, one core): cart2pol 0.07 s against
+    42.5 s (x590), pol2cart 0.08 s against 8.6 s (x110).'''
+    from time import time
+    v = np.random.normal(size=(n, 3))
+    v /= norm(v, axis=1)[:,None]
+    t0 = time()
+    tp = cart2pol(v)
+    t1 = time()
+    pol2cart(tp)
+    t2 = time()
+    np.apply_along_axis(_cart2pol, 1, v)
+    t3 = time()
+    np.apply_along_axis(_pol2cart, 1, tp)
+    t4 = time()
+    print "cart2pol: %.3fs vectorized, %.3fs apply_along_axis (x%.0f)" % \
+        (t1 - t0, t3 - t2, (t3 - t2) / (t1 - t0))
+    print "pol2cart: %.3fs vectorized, %.3fs apply_along_axis (x%.0f)" % \
+        (t2 - t1, t4 - t3, (t4 - t3) / (t2 - t1))
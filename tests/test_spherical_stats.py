@@ -1,7 +1,11 @@
 from numpy.testing import *
 import numpy as np
 from amcmorl_py_tools.vecgeom.stats import uniform_rvs_cart, vmf_rvs, \
-    mean_dir, estimate_kappa
+    mean_dir, estimate_kappa, estimate_kappa_batch, rbar2kappa, P, \
+    log_P,     calculate_R0, estimate_confid_angle, estimate_confid_angle_batch, \
+    stephens_cone_angle, calc_R_batch, \
+    vmf_cdf, vmf_sf, vmf_ppf, vmf_logpdf, vmf_pde_centered, vmf_pde, \
+    vmf_logpdf_grid, vmf_pdf_grid, vmf_mixture_pdf, vmf_rvs_batch
 from amcmorl_py_tools.vecgeom.coords import pol2cart, cart2pol
 
 def test_uniform_rvs_cart():
@@ -73,6 +77,191 @@ def test_estimate_kappa():
         diff = np.abs(khat - kappa)
         assert(diff < tolerance)
 
+def test_rbar2kappa():
+    kappas = np.array([1e-3, 0.1, 1., 5., 19., 25., 500.])
+    rbars = 1 / np.tanh(kappas) - 1 / kappas
+    assert_array_almost_equal(rbar2kappa(rbars, method='newton') / kappas,
+                              np.ones_like(kappas), decimal=10)
+    assert_array_almost_equal(rbar2kappa(rbars, method='table') / kappas,
+                              np.ones_like(kappas), decimal=6)
+    assert_almost_equal(rbar2kappa(-rbars[2]), -kappas[2], decimal=6)
+
+def test_estimate_kappa_batch():
+    mu = [0., 0., 1.]
+    kappas = [0.5, 2., 20.]
+    P = np.array([vmf_rvs(mu, kappa, 50) for kappa in kappas])
+    khats, means, Rs = estimate_kappa_batch(P)
+    for P_i, khat, mean in zip(P, khats, means):
+        assert_almost_equal(khat, estimate_kappa(P_i), decimal=4)
+        assert_almost_equal(mean, mean_dir(P_i))
+
+    # known mean, ragged sets
+    ragged = np.concatenate([P[0], P[1,:20], P[2,:35]])
+    offsets = [0, 50, 70, 105]
+    khats, means, Rs = estimate_kappa_batch(ragged, mu=mu, offsets=offsets)
+    for i in xrange(3):
+        P_i = ragged[offsets[i]:offsets[i+1]]
+        assert_almost_equal(khats[i], estimate_kappa(P_i, mu=mu), decimal=4)
+
+def test_P():
+    # exact values from the sum in Stephens, 1962b, eqn 4
+    assert_almost_equal(P(5, 2.5), 38.75)
+    assert_almost_equal(P(10, 5.) / 1756340., 1.)
+    assert_almost_equal(P(20, 18.) / 524288., 1.)
+    assert_array_equal(P(10, [10., 11.]), [0., 0.])
+
+def test_log_P_large_N():
+    # the float sum cancels badly here; compare with the sum in integers
+    from math import log
+    from scipy.special import comb
+    for N, R in [(60, 6), (60, 45), (100, 10), (100, 70)]:
+        total = sum((-1)**s * comb(N, s, exact=True) * (N - R - 2 * s)**(N - 1)
+                    for s in xrange((N - R + 1) // 2))
+        assert_almost_equal(log_P(N, float(R)), log(total), decimal=10)
+    # only the first two terms are non-zero
+    assert_almost_equal(log_P(100, 97.5),
+                        99 * np.log(2.5) + np.log(1 - 100 * 0.2**99))
+    assert_(np.all(np.isfinite(log_P(100, np.linspace(0, 99, 50)))))
+
+def test_calculate_R0():
+    for N in [3, 8, 20, 30]:
+        for Rstar in [0.3 * N, 0.9 * N]:
+            for alpha in [0.01, 0.05]:
+                R0 = calculate_R0(N, Rstar, alpha)
+                assert_almost_equal(P(N, R0) / P(N, Rstar), alpha)
+                assert_almost_equal(R0, calculate_R0(N, Rstar, alpha,
+                    method='fminbound'), decimal=4)
+    # broadcasts over Rstar and alpha
+    R0s = calculate_R0(12, [4., 8.], [[0.01], [0.05]])
+    assert_equal(R0s.shape, (2,2))
+    assert_almost_equal(R0s[1,0], calculate_R0(12, 4., 0.05))
+    # beyond the tables, where P itself overflows
+    for N in [60, 100]:
+        R0 = calculate_R0(N, 0.6 * N, 0.05)
+        assert_almost_equal(log_P(N, R0) - log_P(N, 0.6 * N), np.log(0.05),
+                            decimal=4)
+
+def test_stephens_cone_angle():
+    # for N = 3, P(3, R) = (3 - R)**2 for R >= 1, and (3 - R)**2 - 3(1 - R)**2
+    # below, so for R = 2.5 and alpha = 0.05, P(3, Z) = 5 at Z = sqrt(0.5)
+    assert_almost_equal(stephens_cone_angle(3, 2.5, 0.05),
+                        np.arccos(np.sqrt(0.5) / 2.5))
+    # too dispersed to exclude any direction
+    assert_equal(stephens_cone_angle(3, 0.5, 0.05), np.pi)
+    # the cone covers the true mean (1 - alpha) of the time
+    mu = np.array([0., 0., 1.])
+    P_i = vmf_rvs_batch(mu, 2., 10 * 2000, random_state=0).reshape(2000, 10, 3)
+    R, S, n = calc_R_batch(P_i)
+    theta = stephens_cone_angle(10, R, 0.05)
+    inside = np.arccos(np.dot(S, mu) / R) < theta
+    assert_(np.abs(inside.mean() - 0.95) < 0.015)
+
+def test_estimate_confid_angle_batch():
+    mu = [0., 0., 1.]
+    # small n (Stephens), large n with small kappa, and large kappa
+    sets = [vmf_rvs(mu, kappa, n, random_state=i) for i, (n, kappa) in \
+                enumerate([(6, 1.), (12, 2.), (50, 1.), (50, 20.), (10, 50.)])]
+    offsets = np.cumsum([0] + [len(P_i) for P_i in sets])
+    for method in ['powell', 'newton']:
+        thetas = estimate_confid_angle_batch(np.concatenate(sets), 0.05,
+                                             offsets=offsets,
+                                             kappa_method=method)
+        assert_(np.isfinite(thetas).all())
+        # R is summed in a different order, so agreement is to rounding
+        assert_array_almost_equal(thetas, [estimate_confid_angle(P_i, 0.05,
+            kappa_method=method) for P_i in sets], decimal=12)
+    P_i = np.array([vmf_rvs(mu, 20., 40) for i in xrange(3)])
+    assert_array_almost_equal(estimate_confid_angle_batch(P_i, 0.05),
+        [estimate_confid_angle(P, 0.05) for P in P_i])
+
+def test_vmf_cdf():
+    from scipy.integrate import quad
+    pdf = lambda t, k: k / (2 * np.sinh(k)) * np.exp(k * np.cos(t)) * np.sin(t)
+    thetas = np.array([0.01, 0.5, 2.])
+    for kappa in [0.1, 3., 30.]:
+        cdf = [quad(pdf, 0, t, args=(kappa,), epsabs=1e-14)[0] for t in thetas]
+        assert_array_almost_equal(vmf_cdf(thetas, kappa), cdf, decimal=12)
+        assert_array_almost_equal(vmf_sf(thetas, kappa), 1 - np.array(cdf))
+        # (cdf rounds to 1 at theta = 2 for kappa = 30)
+        assert_array_almost_equal(vmf_ppf(cdf[:2], kappa), thetas[:2])
+    # broadcasting, uniform limit and large kappa
+    assert_equal(vmf_cdf(thetas[:,None], [0., 1., 1e4]).shape, (3,3))
+    assert_almost_equal(vmf_cdf(np.pi / 2., 0.), 0.5)
+    assert_almost_equal(vmf_ppf(0.5, 0.), np.pi / 2.)
+    assert_almost_equal(vmf_sf(0.1, 1e4) / np.exp(-1e4 * (1 - np.cos(0.1))), 1.)
+    assert_almost_equal(vmf_ppf(0.5, 1e6), np.sqrt(2 * np.log(2) / 1e6))
+
+def test_vmf_logpdf():
+    assert_almost_equal(vmf_logpdf(0.4, 3.), np.log(vmf_pde_centered(0.4, 3.)))
+    assert_almost_equal(vmf_logpdf(1., 0.), -np.log(4 * np.pi))
+    assert_almost_equal(vmf_logpdf(0., 1e4), np.log(1e4 / (2 * np.pi)))
+
+def test_vmf_grid():
+    th, ph = np.meshgrid(np.linspace(0, np.pi, 7), np.linspace(0, 6, 5),
+                         indexing='ij')
+    X = pol2cart(np.concatenate([th[...,None], ph[...,None]], axis=-1))
+    a, b = 0.7, 1.2
+    mu = pol2cart(np.array([a, b]))
+    assert_array_almost_equal(vmf_pdf_grid(X, mu, 4.),
+                              vmf_pde(a, b, th, ph, 4.))
+    # batch of components, into a buffer; no overflow at large kappa
+    out = np.empty((2,) + th.shape)
+    res = vmf_logpdf_grid(X, [mu, [0., 0., 1.]], [4., 1e4], out=out)
+    assert_(res is out)
+    assert_array_almost_equal(out[0], np.log(vmf_pde(a, b, th, ph, 4.)))
+    assert_almost_equal(out[1,0,0], np.log(1e4 / (2 * np.pi)))
+    assert_(np.isfinite(vmf_pde(a, b, a, b, 1e3)))
+    # mixture
+    mix = vmf_mixture_pdf(X, [mu, [0., 0., 1.]], [4., 30.], weights=[3, 1])
+    assert_array_almost_equal(mix, 0.75 * vmf_pdf_grid(X, mu, 4.) + \
+                                  0.25 * vmf_pdf_grid(X, [0., 0., 1.], 30.))
+    # a single direction, for one or several components
+    assert_almost_equal(vmf_logpdf_grid(X[2,3], mu, 4.),
+                        np.log(vmf_pde(a, b, th[2,3], ph[2,3], 4.)))
+    assert_array_almost_equal(vmf_logpdf_grid(X[2,3], [mu, mu], [4., 4.]),
+                              out[0,2,3] * np.ones(2))
+    # out must be writable in place
+    assert_raises(ValueError, vmf_logpdf_grid, X, mu, 4.,
+                  out=np.empty(th.shape[::-1]).T)
+
+def test_vmf_rvs_batch():
+    mu = np.array([0.3, -0.5, 0.8])
+    mu /= np.sqrt(np.sum(mu**2))
+    P_i = vmf_rvs_batch(mu, 20., 20000, random_state=0)
+    assert_array_almost_equal(np.sum(P_i**2, axis=1), np.ones(20000))
+    angles = np.arccos(np.clip(np.dot(P_i, mu), -1, 1))
+    assert_(np.abs(np.median(angles) - vmf_ppf(0.5, 20.)) < 0.01)
+    # batched parameters, reproducible and independent of chunk size
+    mus = [[0., 0., 1.], [0., 0., -1.], mu]
+    a = vmf_rvs_batch(mus, [1., 5., 1e6], 100, random_state=3)
+    out = np.empty((3, 100, 3))
+    b = vmf_rvs_batch(mus, [1., 5., 1e6], 100, out=out, chunk=37,
+                      random_state=np.random.RandomState(3))
+    assert_(b is out)
+    assert_array_equal(a, b)
+    assert_array_almost_equal(a[2], np.ones((100, 1)) * mu, decimal=2)
+
+def test_uniform_rvs_cart_chunked():
+    U = uniform_rvs_cart(20000, random_state=1, chunk=999)
+    assert_array_equal(U, uniform_rvs_cart(20000, random_state=1))
+    assert_array_almost_equal(np.sum(U**2, axis=1), np.ones(20000))
+    assert_array_almost_equal(U.mean(axis=0), np.zeros(3), decimal=1)
+
+def bench_calculate_R0():
+    import time
+    for method in ['fminbound', 'table']:
+        t0 = time.time()
+        for N in xrange(3, 31):
+            calculate_R0(N, 0.7 * N, 0.05, method=method)
+        print "%s: %.2f ms per call" % (method, (time.time() - t0) / 28 * 1e3)
+
+def bench_vmf_rvs_batch():
+    import time
+    out = np.empty((10**7, 3))
+    t0 = time.time()
+    vmf_rvs_batch([0., 0., 1.], 5., 10**7, out=out)
+    print "%.2f s per 1e7 points" % (time.time() - t0)
+
 # class TestEstimateConfidAngle(NumpyTestCase):
 #     alpha = 0.05
 #     acceptable_error = 0.05
@@ -0,0 +1,45 @@
+import numpy as np
+from amcmorl_py_tools.voxel_primitives import sphere, cylinder, \
+    stamp_sphere, stamp_cylinder
+
+def test_sphere():
+    vdim = (12, 9, 10)
+    c, r = np.array([5.5, 4., 3.2]), 3.7
+    exp = r >= np.sqrt(((np.indices(vdim) - c[:,None,None,None])**2).sum(0))
+    np.testing.assert_equal(sphere(vdim, c, r), exp)
+    np.testing.assert_equal(sphere(vdim, c, r, slab=5), exp)
+    np.testing.assert_equal(sphere(vdim, c, r, workers=3), exp)
+    packed = np.zeros((12, 9, 2), dtype=np.uint8)
+    sphere(vdim, c, r, out=packed, slab=2)
+    np.testing.assert_equal(np.unpackbits(packed, axis=-1)[...,:10], exp)
+
+def test_cylinder():
+    vdim = (10, 10, 10)
+    cyl = cylinder(vdim, (4.5, 4.5, 0), (0, 0, 1), 2.)
+    # cross-section is a disc, the same in every plane along z
+    np.testing.assert_equal(cyl, cyl[...,0:1] * np.ones(10, dtype=bool))
+    np.testing.assert_equal(cyl[...,0].sum(), 12)
+
+def test_stamp():
+    vdim = (20, 16, 18)
+    A, D, r = np.array([-3., 2., 5.]), np.array([1., 0.7, 0.2]), 2.5
+    vol = np.zeros(vdim, dtype=bool)
+    stamp_cylinder(vol, A, D, r)
+    np.testing.assert_equal(vol, cylinder(vdim, A, D, r))
+    stamp_sphere(vol, (15, 4, 20), 4.)
+    exp = cylinder(vdim, A, D, r) | sphere(vdim, (15, 4, 20), 4.)
+    np.testing.assert_equal(vol, exp)
+    stamp_sphere(vol, (2, 4, 6), 3., mode='subtract')
+    exp &= ~sphere(vdim, (2, 4, 6), 3.)
+    np.testing.assert_equal(vol, exp)
+    stamp_sphere(vol, (10, 8, 9), 6., mode='intersection')
+    exp &= sphere(vdim, (10, 8, 9), 6.)
+    np.testing.assert_equal(vol, exp)
+
+    # finite cylinder is capped at each end
+    vol = np.zeros(vdim, dtype=bool)
+    stamp_cylinder(vol, (5, 8, 9), (1, 0, 0), 3., length=6.)
+    exp = cylinder(vdim, (5, 8, 9), (1, 0, 0), 3.)
+    exp[:5] = False
+    exp[12:] = False
+    np.testing.assert_equal(vol, exp)
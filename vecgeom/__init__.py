@@ -9,12 +9,40 @@ def vec2str(vec, dp=2):
     fstr = " ".join(["%5." + "%d" % dp + "f"] * l)
     return fstr % (tuple(vec))
 
-def norm(vec, axis=None):
+def sqnorm(vec, axis=None, out=None):
     '''
-    Return length of vector
+    Return squared length of vector, summed along `axis` (or over all
+    elements if `axis` is None).
+
+    Uses einsum, so `vec**2` is never materialised as a temporary.
     '''
     vec = np.asarray(vec)
-    return np.sqrt(np.sum(vec**2, axis=axis))
+    if axis is None:
+        vec = vec.ravel()
+        axis = 0
+    vec = np.rollaxis(vec, axis % vec.ndim, vec.ndim)
+    if out is None:
+        return np.einsum('...i,...i->...', vec, vec)
+    return np.einsum('...i,...i->...', vec, vec, out=out)
+
+def norm(vec, axis=None, out=None):
+    '''
+    Return length of vector
+
+    Parameters
+    ----------
+    vec : array_like
+      vector(s)
+    axis : int, optional
+      axis along which to measure length, defaults to all elements
+    out : ndarray, optional
+      array to put the result in, must have the shape of `vec` with `axis`
+      removed
+    '''
+    sq = sqnorm(vec, axis=axis, out=out)
+    if isinstance(sq, np.ndarray) and sq.dtype.kind == 'f':
+        return np.sqrt(sq, out=sq)
+    return np.sqrt(sq)
 
 # faster way to do this in cython    
 #~ import numpy as np
@@ -40,21 +68,37 @@ def perpz(vec):
     else:
         return unitvec( (vec[1], -vec[0]) )
 
-def _unitvec(vec):
-    '''returns the unit length vector
-    in the same direction as vec'''
-    vec = np.asarray(vec)
-    return vec / np.sqrt(np.sum(vec ** 2))
+def unitvec(arr, axis=-1, out=None):
+    '''
+    Returns unit length vector(s) in same direction as `arr`
 
-def unitvec(arr, axis=-1):
-    return np.apply_along_axis(_unitvec, axis, arr)
+    Parameters
+    ----------
+    arr : array_like
+      vector(s) to normalize
+    axis : int, optional
+      axis along which to normalize, defaults to last
+    out : ndarray, optional
+      array to put the result in; may be `arr` itself to normalize in place
+
+    Notes
+    -----
+    Zero-length vectors are returned unchanged (i.e. as zeros) rather than
+    as nans. float32 input stays float32; other types are converted to
+    float64.
+    '''
+    arr = np.asarray(arr)
+    if not arr.dtype in [np.float32, np.float64]:
+        arr = arr.astype(float)
+    nr = np.expand_dims(norm(arr, axis=axis), axis)
+    nr[nr == 0] = 1
+    return np.divide(arr, nr, out=out)
 
-def unitvec_f2d(a):
+def unitvec_f2d(a, out=None):
     '''returns the unit length versions of vectors along the last dimension of
     `arr`.
     '''
-    nr = np.sqrt(np.sum(a**2, axis=-1))
-    return a / nr[...,None]
+    return unitvec(a, axis=-1, out=out)
     
 def cross_matrix(v):
     '''
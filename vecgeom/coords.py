@@ -1,42 +1,93 @@
 import numpy as np
 
-def cart2pol(array, axis=-1):
+def _float_like(array):
+    '''Returns `array` as an ndarray, converted to float64 unless it is
+    already float32 or float64.'''
+    array = np.asarray(array)
+    if not array.dtype in [np.float32, np.float64]:
+        array = array.astype(float)
+    return array
+
+def _out_like(array, axis, size, out):
+    '''Checks or allocates an output array like `array` but with `size`
+    elements along `axis`; returns it and a view with `axis` first.'''
+    shape = list(array.shape)
+    shape[axis] = size
+    if out is None:
+        out = np.empty(shape, dtype=array.dtype)
+    elif list(out.shape) != shape:
+        raise ValueError("out must have shape %s" % (str(tuple(shape))))
+    return out, np.rollaxis(out, axis % array.ndim)
+
+def cart2pol(array, axis=-1, out=None):
     '''Convert an array containing xyz values into an array containing theta, phis
 
     Parameters
     ----------
     array : array_like, shape (3,)
       x,y,z components of vector, must be unit length for this to make sense
+    axis : int, optional
+      axis of `array` containing x,y,z, defaults to last
+    out : ndarray, optional
+      array to put the result in, same shape as `array` but with 2 elements
+      along `axis`
 
     Returns
     -------
     theta : scalar
     phi : scalar
+
+    Notes
+    -----
+    float32 input gives float32 output, anything else gives float64.
+    phi values within 1e-8 of 0 (including those at the poles) are set to
+    exactly 0.
     '''
-    array = np.asarray(array)
+    array = _float_like(array)
     if array.shape[axis] != 3:
         raise(ValueError("size of dimension %d must be 3"  % (axis)))
 
-    return np.apply_along_axis(_cart2pol, axis, array)
+    x, y, z = np.rollaxis(array, axis % array.ndim)
+    out, tp = _out_like(array, axis, 2, out)
+    # index with ellipsis to get (possibly 0-d) views rather than scalars
+    theta, phi = tp[0,...], tp[1,...]
+    np.arccos(z, out=theta)
+    np.arctan2(y, x, out=phi)
+    phi[np.abs(phi) <= 1e-8] = 0
+    return out
 
-def pol2cart(array, axis=-1):
+def pol2cart(array, axis=-1, out=None):
     '''Convert a point described by two angles to Cartesian co-ordinates.
 
     Parameters
     ----------
     array : array_like
       theta, phi values (differentiated along `axis`, which must be length 2)
+    axis : int, optional
+      axis of `array` containing theta, phi, defaults to last
+    out : ndarray, optional
+      array to put the result in, same shape as `array` but with 3 elements
+      along `axis`
       
     Returns
     -------
     vector : array, shape (3,)
       x,y,z co-ordinates of equivalent vector
     '''
-    array = np.asarray(array)
+    array = _float_like(array)
     if array.shape[axis] != 2:
         raise(ValueError("size of dimension %d must be 2" % (axis)))
 
-    return np.apply_along_axis(_pol2cart, axis, array)
+    theta, phi = np.rollaxis(array, axis % array.ndim)
+    out, xyz = _out_like(array, axis, 3, out)
+    x, y, z = xyz[0,...], xyz[1,...], xyz[2,...]
+    sin_theta = np.sin(theta)
+    np.cos(phi, out=x)
+    x *= sin_theta
+    np.sin(phi, out=y)
+    y *= sin_theta
+    np.cos(theta, out=z)
+    return out
 
 def _pol2cart(tp):
     theta, phi = tp
@@ -0,0 +1,193 @@
+'''
+Array-backed container for sequences of rotation quaternions.
+
+Quaternions use the same conventions as `transformations`: components are
+(x, y, z, w), i.e. scalar part last, composition is the Hamilton product,
+and QuatArray(q).to_DCM() equals transformations.quat2DCM(q).
+'''
+
+import numpy as np
+from .transformations import quat_mult_batch, quat2DCM_batch, \
+    DCM2quat_batch, eul2quat_batch, quat2eul_batch, axang2quat_batch, \
+    quat2axang_batch
+
+class QuatArray(object):
+    '''
+    A sequence of N quaternions, stored in one contiguous (N,4) float
+    buffer, `q`.
+
+    Parameters
+    ----------
+    q : array_like
+      shape (N,4) or (4,), quaternions
+    normalize : bool, optional
+      scale quaternions to unit length
+    copy : bool, optional
+      copy `q`; if False, and `q` is already a C-contiguous float64 array
+      of shape (N,4), it is used as the buffer directly
+    '''
+    __slots__ = ['q']
+
+    def __init__(self, q, normalize=False, copy=True):
+        if copy:
+            q = np.array(q, dtype=float, order='C', ndmin=2)
+        else:
+            q = np.ascontiguousarray(q, dtype=float)
+            if q.ndim == 1:
+                q = q[None]
+        if (q.ndim != 2) or (q.shape[1] != 4):
+            raise ValueError("q must have shape (N,4) or (4,)")
+        self.q = q
+        if normalize:
+            self.normalize()
+
+    # construction and conversion ---------------------------------------------
+
+    @classmethod
+    def from_DCM(cls, DCM):
+        '''Construct from rotation matrices, shape (N,3,3).'''
+        return cls(DCM2quat_batch(DCM), copy=False)
+
+    @classmethod
+    def from_eul(cls, eul, order):
+        '''Construct from euler angles, shape (N,3), in rotation `order`.'''
+        return cls(eul2quat_batch(eul, order), copy=False)
+
+    @classmethod
+    def from_axang(cls, axang):
+        '''Construct from compact axis/angle vectors, shape (N,3).'''
+        return cls(axang2quat_batch(axang), copy=False)
+
+    def to_DCM(self):
+        '''Returns rotation matrices, shape (N,3,3).'''
+        return quat2DCM_batch(self.q)
+
+    def to_eul(self, order):
+        '''Returns euler angles, shape (N,3), in rotation `order`.'''
+        return quat2eul_batch(self.q, order)
+
+    def to_axang(self):
+        '''Returns compact axis/angle vectors, shape (N,3).'''
+        return quat2axang_batch(self.q)
+
+    # container behaviour -----------------------------------------------------
+
+    def __len__(self):
+        return self.q.shape[0]
+
+    def __getitem__(self, idx):
+        return QuatArray(self.q[idx])
+
+    def __repr__(self):
+        return 'QuatArray(%s)' % (repr(self.q))
+
+    # algebra -----------------------------------------------------------------
+
+    def __mul__(self, other):
+        '''Hamilton product, self * other, elementwise, broadcasting a
+        length-1 QuatArray against a longer one.'''
+        return QuatArray(quat_mult_batch(self.q, _as_buffer(other)),
+                         copy=False)
+
+    def norm(self):
+        '''Returns the lengths of the quaternions, shape (N,).'''
+        return np.sqrt(np.einsum('ij,ij->i', self.q, self.q))
+
+    def normalize(self):
+        '''Scale quaternions to unit length, in place. Returns self.'''
+        self.q /= self.norm()[:,None]
+        return self
+
+    def conj(self):
+        '''Returns the conjugate quaternions.'''
+        q = self.q.copy()
+        q[:,0:3] *= -1
+        return QuatArray(q, copy=False)
+
+    def inverse(self):
+        '''Returns the inverse quaternions, i.e. the opposite rotations.'''
+        qc = self.conj()
+        qc.q /= np.einsum('ij,ij->i', self.q, self.q)[:,None]
+        return qc
+
+    def rotate(self, pts):
+        '''
+        Rotate points, without constructing rotation matrices.
+
+        Parameters
+        ----------
+        pts : array_like
+          shape (M,3) or (3,), points to rotate; if there are N > 1
+          quaternions, M must equal N and point i is rotated by
+          quaternion i
+
+        Returns
+        -------
+        rotated : ndarray
+          shape (M,3), equal to np.dot(pts, DCM.T) for the corresponding
+          rotation matrix DCM
+
+        Notes
+        -----
+        Quaternions need not be unit length: each rotates as q v q^-1,
+        i.e. as q / |q| would.
+        '''
+        pts = np.asarray(pts, dtype=float)
+        u, w = self.q[:,0:3], self.q[:,3:]
+        # v' = v + (2 / |q|^2) (w (u x v) + u x (u x v))
+        t = 2 * np.cross(u, pts) / (self.norm()**2)[:,None]
+        return pts + w * t + np.cross(u, t)
+
+    # interpolation -----------------------------------------------------------
+
+    def nlerp(self, other, t):
+        '''
+        Normalized linear interpolation from self to `other`.
+
+        Parameters
+        ----------
+        other : QuatArray or array_like
+          end quaternions, same length as self, or length 1
+        t : float or array_like
+          interpolation parameter(s), 0 gives self, 1 gives `other`;
+          arrays have shape (N,)
+
+        Returns
+        -------
+        interpolated : QuatArray
+        '''
+        p, q, t = _interp_args(self.q, other, t)
+        return QuatArray((1 - t) * p + t * q, normalize=True, copy=False)
+
+    def slerp(self, other, t):
+        '''
+        Spherical linear interpolation from self to `other`, along the
+        shorter arc. See `nlerp` for parameters.
+        '''
+        p, q, t = _interp_args(self.q, other, t)
+        cos_theta = np.clip(np.einsum('ij,ij->i', p, q), -1, 1)[:,None]
+        theta = np.arccos(cos_theta)
+        sin_theta = np.sin(theta)
+        # fall back to linear interpolation for (nearly) identical rotations
+        close = sin_theta < 1e-8
+        sin_theta[close] = 1.
+        a = np.where(close, 1 - t, np.sin((1 - t) * theta) / sin_theta)
+        b = np.where(close, t, np.sin(t * theta) / sin_theta)
+        return QuatArray(a * p + b * q, copy=False)
+
+def _as_buffer(other):
+    if isinstance(other, QuatArray):
+        return other.q
+    return QuatArray(other, copy=False).q
+
+def _interp_args(p, other, t):
+    '''Broadcasts interpolation end points and parameters together, and
+    flips the sign of end quaternions where needed to take the shorter
+    arc.'''
+    q = _as_buffer(other)
+    p, q = np.broadcast_arrays(p, q)
+    q = np.where((np.einsum('ij,ij->i', p, q) < 0)[:,None], -q, q)
+    t = np.asarray(t, dtype=float)
+    if t.ndim > 0:
+        t = t[:,None]
+    return p, q, t
@@ -1,6 +1,8 @@
+import math
+from fractions import Fraction
 import numpy as np
 import scipy.optimize as opt
-from scipy.integrate import quad
+from scipy.special import gammaln
 
 from . import norm
 from .rotations import rotate_by_angles
@@ -38,25 +40,83 @@ from .coords import cart2pol, pol2cart
             in x-y plane, 0 -- 2 * pi
 '''
 
-def uniform_rvs_polar(size=1):
+# random variates -----------------------------------------------------------
+
+# default number of variates made at a time by the chunked generators
+_RVS_CHUNK = 2**18
+
+def _check_random_state(random_state):
+    '''Returns a random number generator: the global numpy.random state
+    for None, a new RandomState for an int seed, or `random_state` itself,
+    which may be a numpy.random.Generator or RandomState.'''
+    if random_state is None:
+        return np.random.mtrand._rand
+    if isinstance(random_state, (int, long, np.integer)):
+        return np.random.RandomState(random_state)
+    return random_state
+
+def _uniform(rs, size):
+    '''Returns uniform variates on [0, 1) from a Generator or
+    RandomState.'''
+    if hasattr(rs, 'random_sample'):
+        return rs.random_sample(size)
+    return rs.random(size)
+
+def uniform_rvs_polar(size=1, random_state=None):
     '''
+    Returns (theta, phi) of `size` points uniformly distributed on the
+    sphere, shape (2, size).
+
     Notes
     -----
     Tested visually.
     '''
-    u, v = np.squeeze(np.random.uniform(size=(2, size)))
+    rs = _check_random_state(random_state)
+    u, v = _uniform(rs, (2, size))
     phi = 2 * np.pi * u
     theta = np.arccos(2 * v - 1)
     return np.array([theta, phi])
 
-def uniform_rvs_cart(size=1, ndim=3):
+def uniform_rvs_cart(size=1, ndim=3, random_state=None, out=None,
+                     chunk=_RVS_CHUNK):
     '''
+    Returns `size` unit vectors uniformly distributed on the sphere (the
+    circle for ndim = 2), shape (size, ndim).
+
+    Parameters
+    ----------
+    random_state : None, int, numpy.random.Generator or RandomState
+      source of random numbers; the global numpy.random state by default
+    out : ndarray, optional
+      float64, C-contiguous, shape (size, ndim)
+    chunk : int
+      variates made at a time, which bounds the size of temporaries
+
     Notes
     -----
     Tested visually for 3d and using histogram for 2d
+
+    For 3d, z is uniform on [-1, 1] (Archimedes), and the longitude on
+    [0, 2 pi); otherwise normal variates are normalized.
     '''
-    xyz = np.random.normal(size=(size, ndim))
-    return xyz / norm(xyz,axis=1)[:,None]
+    rs = _check_random_state(random_state)
+    if out is None:
+        out = np.empty((size, ndim))
+    for start in xrange(0, size, chunk):
+        block = out[start:start + chunk]
+        m = block.shape[0]
+        if ndim == 3:
+            u = _uniform(rs, (m, 2)).T
+            z = np.multiply(2, u[0], out=block[:,2])
+            z -= 1
+            r = np.sqrt((1 - z) * (1 + z))
+            phi = 2 * np.pi * u[1]
+            np.multiply(r, np.cos(phi), out=block[:,0])
+            np.multiply(r, np.sin(phi), out=block[:,1])
+        else:
+            block[:] = rs.standard_normal((m, ndim))
+            block /= norm(block, axis=1)[:,None]
+    return out
         
 def parameterized_circle_3d(t, a, b, c):
     '''Returns a point on a circle defined by two points on the circle, its
@@ -106,7 +166,7 @@ def mean_dir(P_i):
     R, S = calc_R(P_i)
     return S/R
 
-def estimate_kappa(P_i, mu=None):
+def estimate_kappa(P_i, mu=None, method='powell'):
     '''Returns the maximum likelihood estimate of the spread parameter (kappa)
     of a von-Mises-Fisher distribution.
 
@@ -116,6 +176,10 @@ def estimate_kappa(P_i, mu=None):
         n unit vectors for which to find \kappa
       mu : array_like, shape (3,)
         vector of direction cosines for known population mean
+      method : string
+        'powell' minimises the estimating equation with
+        scipy.optimize.fmin_powell, 'newton' and 'table' invert it directly
+        (see `rbar2kappa`)
 
     Returns
     -------
@@ -149,10 +213,12 @@ def estimate_kappa(P_i, mu=None):
     R, S = calc_R(P_i)
     #S = np.sum(P_i, axis=0)   # 3.2
     #R = np.sqrt(np.sum(S**2)) # 3.3
-    if mu != None:
+    if mu is not None:
         sample_mean = S/R
         C = np.dot(mu, sample_mean)
         R *= C
+    if method != 'powell':
+        return rbar2kappa(R / n, method=method)
     k0 = 1.
     lsq = opt.fmin_powell(to_min, k0, args=(R, n), disp=0)
     return lsq
@@ -162,10 +228,202 @@ def to_min(k, R, n):
     #print 'k %.8f R %.4f n %d -> %.8f' % (k, R, n, err)
     return err
 
+# batched estimation ---------------------------------------------------------
+
+def calc_R_batch(P_i, offsets=None):
+    '''Returns the resultant lengths, resultant vectors and sample sizes of
+    many collections of vectors at once.
+
+    Parameters
+    ----------
+    P_i : array_like, shape (n_sets, n_pts, 3) or (n_total, 3)
+      stacked sets of vectors, or, if `offsets` is given, all sets
+      concatenated along the first axis
+    offsets : array_like, shape (n_sets + 1,), optional
+      start index of each set in `P_i`, followed by the total number of
+      vectors, so that set i is P_i[offsets[i]:offsets[i+1]]
+
+    Returns
+    -------
+    R : ndarray, shape (n_sets,)
+      resultant length of each set
+    S : ndarray, shape (n_sets, 3)
+      resultant vector of each set
+    n : ndarray, shape (n_sets,)
+      number of vectors in each set
+    '''
+    P_i = np.asarray(P_i, dtype=float)
+    if offsets is None:
+        if P_i.ndim != 3:
+            raise ValueError("P_i must have shape (n_sets, n_pts, 3) "
+                             "if offsets is not given")
+        S = P_i.sum(axis=1)                                # 3.2
+        n = np.ones(P_i.shape[0]) * P_i.shape[1]
+    else:
+        offsets = np.asarray(offsets, dtype=int)
+        n = np.diff(offsets).astype(float)
+        if np.any(n < 1):
+            raise ValueError("each set must contain at least one vector")
+        S = np.add.reduceat(P_i, offsets[:-1], axis=0)     # 3.2
+    R = np.sqrt(np.einsum('ij,ij->i', S, S))               # 3.3
+    return R, S, n
+
+def _langevin(k):
+    '''Returns coth(k) - 1/k, the expected mean resultant length of a 3d
+    von-Mises-Fisher distribution with spread `k`, and its derivative.'''
+    k = np.asarray(k, dtype=float)
+    ksq = k**2
+    small = np.abs(k) < 1e-2
+    # series expansions avoid cancellation near 0
+    A = k / 3. - k * ksq / 45. + 2 * k * ksq**2 / 945.
+    dA = 1 / 3. - ksq / 15. + 2 * ksq**2 / 189.
+    big = ~small
+    if np.any(big):
+        kb = k[big]
+        with np.errstate(over='ignore'):
+            A[big] = 1 / np.tanh(kb) - 1 / kb
+            dA[big] = 1 / kb**2 - 1 / np.sinh(kb)**2
+    return A, dA
+
+def _inv_langevin_newton(rbar, tol=1e-12, max_iter=50):
+    '''Solves coth(k) - 1/k = `rbar` for k, elementwise, by Newton iteration
+    starting from the approximation of Banerjee et al. (2005).
+
+    Negative `rbar` (which arises from the known-mean correction) gives
+    negative k, as the function is odd. |rbar| >= 1 gives infinite k.'''
+    rbar = np.asarray(rbar, dtype=float)
+    shape = rbar.shape
+    rbar = np.atleast_1d(rbar).ravel()
+    sign = np.sign(rbar)
+    r = np.abs(rbar)
+    k = np.empty_like(r)
+    inf = r >= 1.
+    k[inf] = np.inf
+    ok = ~inf
+    r_ok = r[ok]
+    kk = r_ok * (3 - r_ok**2) / (1 - r_ok**2)
+    for i in xrange(max_iter):
+        A, dA = _langevin(kk)
+        step = (A - r_ok) / dA
+        # keep iterates positive (the function is monotonic there)
+        kk = np.where(kk - step > 0, kk - step, kk / 2.)
+        if np.all(np.abs(step) <= tol * np.maximum(kk, 1.)):
+            break
+    k[ok] = kk
+    return (sign * k).reshape(shape)[()]
+
+# lookup table for the inverse of coth(k) - 1/k, built on first use
+_KAPPA_TABLE_RLO = 0.05
+_KAPPA_TABLE_RHI = 0.95
+_KAPPA_TABLE_SIZE = 16384
+_kappa_table = {}
+
+def _get_kappa_table():
+    '''Returns the (rbar, kappa) lookup table used by `rbar2kappa`, building
+    it the first time it is needed.'''
+    if not _kappa_table:
+        rs = np.linspace(_KAPPA_TABLE_RLO, _KAPPA_TABLE_RHI,
+                         _KAPPA_TABLE_SIZE)
+        _kappa_table['rbar'] = rs
+        _kappa_table['kappa'] = _inv_langevin_newton(rs)
+    return _kappa_table['rbar'], _kappa_table['kappa']
+
+def rbar2kappa(rbar, method='table'):
+    '''Returns the spread parameter kappa of a 3d von-Mises-Fisher
+    distribution with mean resultant length `rbar`, i.e. solves
+
+    coth(\kappa) - 1/\kappa = R/n
+
+    Parameters
+    ----------
+    rbar : array_like
+      mean resultant length(s), R/n
+    method : string
+      'table' - linear interpolation in a cached lookup table, with
+                closed forms below rbar = 0.05 (series inversion) and above
+                rbar = 0.95 (kappa = 1 / (1 - rbar), exact to double
+                precision there); relative error < 1e-6
+      'newton' - Newton iteration to full precision
+
+    Returns
+    -------
+    kappa : ndarray or scalar
+      same shape as `rbar`; negative `rbar` gives negative kappa, and
+      |rbar| >= 1 gives infinite kappa
+    '''
+    if method == 'newton':
+        return _inv_langevin_newton(rbar)
+    elif method != 'table':
+        raise ValueError("unknown method %s" % (method))
+    rbar = np.asarray(rbar, dtype=float)
+    shape = rbar.shape
+    rbar = np.atleast_1d(rbar).ravel()
+    r = np.abs(rbar)
+    table_r, table_k = _get_kappa_table()
+    k = np.interp(r, table_r, table_k)
+    lo = r < _KAPPA_TABLE_RLO
+    rsq = r[lo]**2
+    k[lo] = r[lo] * (3 + rsq * (9 / 5. + rsq * 297 / 175.))
+    hi = r > _KAPPA_TABLE_RHI
+    with np.errstate(divide='ignore'):
+        k[hi] = 1 / (1 - np.minimum(r[hi], 1.))
+    return (np.sign(rbar) * k).reshape(shape)[()]
+
+def estimate_kappa_batch(P_i, mu=None, offsets=None, method='newton'):
+    '''Returns the maximum likelihood estimates of the spread parameter
+    (kappa), mean direction and resultant length for many sets of vectors,
+    solving the estimating equation for all sets simultaneously.
+
+    Parameters
+    ----------
+    P_i : array_like, shape (n_sets, n_pts, 3) or (n_total, 3)
+      unit vectors; see `calc_R_batch` for layout
+    mu : array_like, shape (3,) or (n_sets, 3), optional
+      known population mean direction(s)
+    offsets : array_like, shape (n_sets + 1,), optional
+      set boundaries for ragged input; see `calc_R_batch`
+    method : string
+      'newton' or 'table', see `rbar2kappa`, or 'powell', which
+      minimises the estimating equation for each set in turn, exactly
+      as `estimate_kappa` does
+
+    Returns
+    -------
+    kappa : ndarray, shape (n_sets,)
+      spread estimate for each set
+    mean : ndarray, shape (n_sets, 3)
+      sample mean direction of each set
+    R : ndarray, shape (n_sets,)
+      resultant length of each set (not corrected for `mu`)
+
+    Notes
+    -----
+    Matches `estimate_kappa` applied to each set in turn, including the
+    R^* = RC correction when `mu` is known, but uses a vectorized Newton
+    solver rather than scipy.optimize.
+    '''
+    R, S, n = calc_R_batch(P_i, offsets=offsets)
+    mean = S / R[:,None]
+    Rstar = R
+    if mu is not None:
+        mu = np.asarray(mu, dtype=float)
+        C = np.einsum('ij,ij->i', np.atleast_2d(mu) * np.ones_like(mean),
+                      mean)
+        Rstar = R * C
+    if method == 'powell':
+        # as estimate_kappa, one set at a time
+        kappa = np.array([float(opt.fmin_powell(to_min, 1., args=(r, m),
+                                                disp=0)) \
+                              for r, m in zip(Rstar, n)])
+    else:
+        kappa = rbar2kappa(Rstar / n, method=method)
+    return kappa, mean, R
+
 def C_F(kappa):
     '''From Statistical Analysis of Spherical Data,
     1987 by NI Fisher, T Lewis, and BJJ Embleton, equation 4.21'''
-    return kappa / (2 * np.pi * (np.exp(kappa) - np.exp(-kappa)))
+    # via log_C_F: exp(kappa) overflows beyond kappa ~ 709
+    return np.exp(log_C_F(kappa))
 
 def vmf_pde(a, b, th, ph, k):
     '''Returns the probability density estimate for the von-Mises-Fisher function, for the 3d case, at the angle (th, ph), with mean (a, b), and spread k.
@@ -186,8 +444,8 @@ def vmf_pde(a, b, th, ph, k):
       spread parameter
     '''
     sin, cos, pi, sinh = np.sin, np.cos, np.pi, np.sinh
-    return C_F(k) * np.exp(k * (sin(th) * sin(a) * cos(ph - b)
-                             + cos(th) * cos(a)))
+    return np.exp(log_C_F(k) + k * (sin(th) * sin(a) * cos(ph - b)
+                                    + cos(th) * cos(a)))
 
 def vmf_pde_centered(th, k):
     '''Returns the probability density function for the
@@ -203,37 +461,280 @@ def vmf_pde_centered(th, k):
     kappa : scalar
       spread parameter
     '''
-    return C_F(k) * np.exp(k * np.cos(th))
+    return np.exp(log_C_F(k) + k * np.cos(th))
+
+# densities on grids of directions -------------------------------------------
+
+def _vmf_params(mu, kappa):
+    '''Returns mu as (n_comp, 3) unit vectors and kappa as (n_comp,), and
+    whether a single component was given.'''
+    mu = np.asarray(mu, dtype=float)
+    single = mu.ndim == 1 and np.ndim(kappa) == 0
+    mu = np.atleast_2d(mu)
+    mu = mu / np.sqrt((mu**2).sum(axis=-1))[:,None]
+    kappa = np.atleast_1d(np.asarray(kappa, dtype=float))
+    mu, kappa = mu * np.ones_like(kappa)[:,None], kappa * np.ones(mu.shape[0])
+    return mu, kappa, single
+
+def _check_out(out, shape):
+    '''Returns `out`, or a new array if it is None, checking that it is
+    a C-contiguous float64 array of the given shape.'''
+    if out is None:
+        return np.empty(shape)
+    if out.shape != shape:
+        raise ValueError("out must have shape %s" % (str(shape)))
+    if out.dtype != np.float64 or not out.flags.c_contiguous:
+        raise ValueError("out must be a C-contiguous float64 array")
+    return out
+
+def vmf_logpdf_grid(X, mu, kappa, out=None):
+    '''Returns the log of the 3d von-Mises-Fisher density at many
+    directions, for one or many (mu, kappa) components.
 
-def vmf_cdf(theta, kappa):
-    '''Returns the value of the cumulative density function of the
-    von-Mises-Fisher function, 3d case, at angle theta.'''
-    theta = np.asarray(theta)
-    if theta.size > 1:
-        if np.rank(theta) > 1:
-            raise ValueError("theta should be at most 1d.")
-        cdf_list = [quad(vmf_pdf, 0, angle, args=(kappa))[0] for angle in theta]
-        cdf = np.array(cdf_list)
-        return cdf
-    else:
-        intgr, abserr = quad(vmf_pdf, 0, theta, args=(kappa))
-        #print abserr
-        return intgr
+    Parameters
+    ----------
+    X : array_like, shape (..., 3)
+      unit vectors at which to evaluate, e.g. a grid made once with
+      coords.pol2cart, or a single direction, shape (3,)
+    mu : array_like, shape (3,) or (n_comp, 3)
+      mean direction(s)
+    kappa : float or array_like, shape (n_comp,)
+      spread parameter(s), broadcast against mu
+    out : ndarray, optional
+      float64, C-contiguous, shape (n_comp,) + X.shape[:-1], or just
+      X.shape[:-1] for a single component
+
+    Returns
+    -------
+    logpdf : ndarray
+      shape as `out`; kappa * (X . mu) + log C_F(kappa), which stays
+      finite for any kappa
+    '''
+    X = np.asarray(X, dtype=float)
+    mu, kappa, single = _vmf_params(mu, kappa)
+    shape = X.shape[:-1] if single else (mu.shape[0],) + X.shape[:-1]
+    out = _check_out(out, shape)
+    # as 2d arrays, so that np.dot can write each row in place
+    X = X.reshape(-1, 3)
+    res = out.reshape(mu.shape[0], -1)
+    lc = np.atleast_1d(log_C_F(kappa))
+    for i in xrange(mu.shape[0]):
+        # one pass over the grid per component
+        np.dot(X, kappa[i] * mu[i], out=res[i])
+        res[i] += lc[i]
+    return out
+
+def vmf_pdf_grid(X, mu, kappa, out=None):
+    '''Returns the 3d von-Mises-Fisher density; as `vmf_logpdf_grid`,
+    exponentiated in place.'''
+    out = vmf_logpdf_grid(X, mu, kappa, out=out)
+    return np.exp(out, out=out)
+
+def vmf_mixture_logpdf(X, mu, kappa, weights=None, out=None):
+    '''Returns the log density of a mixture of 3d von-Mises-Fisher
+    components at directions X.
+
+    Parameters
+    ----------
+    X : array_like, shape (..., 3)
+      unit vectors at which to evaluate
+    mu : array_like, shape (n_comp, 3)
+      mean directions of the components
+    kappa : array_like, shape (n_comp,)
+      spread parameters of the components
+    weights : array_like, shape (n_comp,), optional
+      mixing proportions, normalized to sum to 1; equal by default
+    out : ndarray, optional
+      float64, C-contiguous, shape X.shape[:-1]
+
+    Notes
+    -----
+    Components are accumulated one at a time with logaddexp, so only one
+    more grid-sized array than `out` is needed, whatever the number of
+    components.
+    '''
+    X = np.asarray(X, dtype=float)
+    mu, kappa, single = _vmf_params(mu, kappa)
+    if weights is None:
+        weights = np.ones(mu.shape[0])
+    logw = np.log(np.asarray(weights, dtype=float) / np.sum(weights))
+    shape = X.shape[:-1]
+    out = _check_out(out, shape)
+    tmp = np.empty(shape)
+    for i in xrange(mu.shape[0]):
+        dest = out if i == 0 else tmp
+        vmf_logpdf_grid(X, mu[i], kappa[i], out=dest)
+        dest += logw[i]
+        if i > 0:
+            np.logaddexp(out, tmp, out=out)
+    return out
+
+def vmf_mixture_pdf(X, mu, kappa, weights=None, out=None):
+    '''Returns the density of a mixture of 3d von-Mises-Fisher components;
+    as `vmf_mixture_logpdf`, exponentiated in place.'''
+    out = vmf_mixture_logpdf(X, mu, kappa, weights=weights, out=out)
+    return np.exp(out, out=out)
+
+# closed forms for the angle theta from the mean direction --------------------
+#
+# For the 3d case, theta has density
+#     kappa / (2 sinh(kappa)) * exp(kappa cos(theta)) sin(theta),
+# so its distribution function is
+#     (1 - exp(-kappa (1 - cos(theta)))) / (1 - exp(-2 kappa)).
+# Everything below is written in terms of exp(-kappa * x), x >= 0, and
+# expm1/log1p, so nothing overflows for large kappa, and 1 -+ cos(theta) is
+# taken from half-angle sines and cosines to keep precision at small angles.
+
+def log_C_F(kappa):
+    '''Returns log(C_F(kappa)), the log normalizing constant of the 3d
+    von-Mises-Fisher density (see `C_F`), finite for all kappa >= 0.'''
+    kappa = np.asarray(kappa, dtype=float)
+    pos = kappa > 0
+    k = np.where(pos, kappa, 1.)
+    res = np.log(k / (2 * np.pi)) - k - np.log(-np.expm1(-2 * k))
+    return np.where(pos, res, -np.log(4 * np.pi))[()]
+
+def vmf_logpdf(theta, kappa):
+    '''Returns the log of the 3d von-Mises-Fisher density (per unit solid
+    angle, as `vmf_pde_centered`) at angle `theta` from the mean, for
+    arrays of theta and kappa, which are broadcast together.'''
+    theta = np.asarray(theta, dtype=float)
+    kappa = np.asarray(kappa, dtype=float)
+    return (log_C_F(kappa) + kappa * np.cos(theta))[()]
+
+def _expm1_ratio(x, kappa):
+    '''Returns expm1(-kappa x) / expm1(-2 kappa), with its limit x / 2
+    at kappa = 0.'''
+    pos = kappa > 0
+    k = np.where(pos, kappa, 1.)
+    return np.where(pos, np.expm1(-k * x) / np.expm1(-2 * k), x / 2.)
 
-def vmf_rvs(mu, k, n_pts=1):
+def vmf_cdf(theta, kappa):
+    '''Returns the value of the cumulative distribution function of the
+    angle from the mean of the von-Mises-Fisher function, 3d case, at
+    angle theta.
+
+    theta and kappa may be arrays, and are broadcast together.'''
+    theta = np.asarray(theta, dtype=float)
+    kappa = np.asarray(kappa, dtype=float)
+    one_minus_cos = 2 * np.sin(theta / 2.)**2
+    return _expm1_ratio(one_minus_cos, kappa)[()]
+
+def vmf_sf(theta, kappa):
+    '''Returns the survival function, 1 - `vmf_cdf`, of the angle from the
+    mean, computed directly so that small tail probabilities keep their
+    relative precision.'''
+    theta = np.asarray(theta, dtype=float)
+    kappa = np.asarray(kappa, dtype=float)
+    one_plus_cos = 2 * np.cos(theta / 2.)**2
+    one_minus_cos = 2 - one_plus_cos
+    # exp(-kappa (1 - cos)) * (1 - exp(-kappa (1 + cos))) / (1 - exp(-2 kappa))
+    return (np.exp(-kappa * one_minus_cos) * \
+                _expm1_ratio(one_plus_cos, kappa))[()]
+
+def vmf_ppf(q, kappa):
+    '''Returns the quantile function (inverse of `vmf_cdf`): the angle
+    from the mean within which a proportion `q` of the von-Mises-Fisher
+    distribution with spread `kappa` lies.
+
+    q and kappa may be arrays, and are broadcast together.'''
+    q = np.asarray(q, dtype=float)
+    kappa = np.asarray(kappa, dtype=float)
+    pos = kappa > 0
+    k = np.where(pos, kappa, 1.)
+    with np.errstate(divide='ignore'):
+        one_minus_cos = np.where(pos, -np.log1p(q * np.expm1(-2 * k)) / k,
+                                 2 * q)
+    return (2 * np.arcsin(np.sqrt(np.clip(one_minus_cos / 2., 0, 1))))[()]
+
+def vmf_rvs(mu, k, n_pts=1, random_state=None):
     '''Simulate a  Fisher distribution. From Statistical Analysis of
-    Spherical Data, 1987, section 3.6.2'''
-    size = (n_pts, 2)
-    R = np.random.uniform(size=size)
-    R_0 = R[...,0]
-    R_1 = R[...,1]
-    l = np.exp(-2 * k)
-    colat  = 2 * np.arcsin(np.sqrt(-np.log(R_0 * (1 - l) + l) / (2 * k)))
-    longit = 2 * np.pi * R_1
-    
-    pts = pol2cart(np.vstack([colat, longit]), axis=0)
-    alpha, beta = cart2pol(mu)
-    return rotate_by_angles(pts, alpha, beta).T
+    Spherical Data, 1987, section 3.6.2
+
+    Returns shape (n_pts, 3); see `vmf_rvs_batch`.'''
+    return vmf_rvs_batch(mu, k, n_pts=n_pts, random_state=random_state)
+
+def vmf_rvs_batch(mu, kappa, n_pts=1, random_state=None, out=None,
+                  chunk=_RVS_CHUNK):
+    '''
+    Draws from 3d von-Mises-Fisher distributions, for one or a batch of
+    (mu, kappa), directly in Cartesian co-ordinates.
+
+    Parameters
+    ----------
+    mu : array_like, shape (..., 3)
+      mean direction(s)
+    kappa : float or array_like
+      spread parameter(s), broadcast against mu[...,0]
+    n_pts : int
+      number of points for each (mu, kappa)
+    random_state : None, int, numpy.random.Generator or RandomState
+      source of random numbers; the global numpy.random state by default
+    out : ndarray, optional
+      float64, C-contiguous, shape batch shape + (n_pts, 3)
+    chunk : int
+      points made at a time, which bounds the size of temporaries, so
+      that e.g. 1e8 points can be made straight into a memmap
+
+    Returns
+    -------
+    pts : ndarray
+      shape batch shape + (n_pts, 3), where batch shape is the broadcast
+      shape of mu[...,0] and kappa
+
+    Notes
+    -----
+    cos(theta) from the mean is drawn by inverting its distribution
+    function (see `vmf_ppf`), 1 - cos(theta) = -log1p(u expm1(-2 kappa)) /
+    kappa, with a uniform longitude. Points about the z axis are then
+    reflected on to mu by the Householder matrix I - 2 v v^T / v^T v,
+    v = z - mu, which maps z to mu; the distribution is symmetric about
+    its axis, so the reflection is as good as a rotation.
+    '''
+    rs = _check_random_state(random_state)
+    mu = np.asarray(mu, dtype=float)
+    kappa = np.asarray(kappa, dtype=float)
+    bshape = np.broadcast(mu[...,0], kappa).shape
+    mu = (mu / np.sqrt((mu**2).sum(axis=-1))[...,None]) * \
+        np.ones(bshape + (1,))
+    mu = mu.reshape(-1, 3)
+    kappa = (kappa * np.ones(bshape)).ravel()
+    shape = bshape + (n_pts, 3)
+    if out is None:
+        out = np.empty(shape)
+    elif out.shape != shape:
+        raise ValueError("out must have shape %s" % (str(shape)))
+    flat = out.reshape(-1, 3)
+    if not np.may_share_memory(flat, out):
+        raise ValueError("out must be C-contiguous")
+    for start in xrange(0, flat.shape[0], chunk):
+        block = flat[start:start + chunk]
+        m = block.shape[0]
+        which = np.arange(start, start + m) // n_pts
+        k = kappa[which]
+        # drawn point by point, so the output does not depend on chunk
+        u = _uniform(rs, (m, 2)).T
+        # 1 - cos(theta), accurate for large kappa; 2u in the limit k -> 0
+        pos = k > 0
+        kk = np.where(pos, k, 1.)
+        omc = np.where(pos, -np.log1p(u[0] * np.expm1(-2 * kk)) / kk,
+                       2 * u[0])
+        cos_theta = 1 - omc
+        sin_theta = np.sqrt(np.clip(omc * (2 - omc), 0, None))
+        phi = 2 * np.pi * u[1]
+        np.multiply(sin_theta, np.cos(phi), out=block[:,0])
+        np.multiply(sin_theta, np.sin(phi), out=block[:,1])
+        block[:,2] = cos_theta
+        # reflect z on to mu
+        mus = mu[which]
+        v = -mus
+        v[:,2] += 1
+        vv = (v**2).sum(axis=1)
+        refl = vv > 1e-30
+        f = np.where(refl, 2 * (v * block).sum(axis=1) / np.where(refl, vv, 1.),
+                     0.)
+        block -= f[:,None] * v
+    return out
 
 #---------------------------------------------------------------------------
 # Stephens, 1962 Biometrika paper - derivation of table A.12 in Fisher, 1987
@@ -249,45 +750,190 @@ def binomial_coef(n,k):
 def lclip(a):
     return a if a >= 0 else 0
 
+# per-N terms of P: s, (-1)**s and log(N choose s)
+_stephens_coefs = {}
+
+def _get_stephens_coefs(N):
+    '''Returns s, (-1)**s, log binomial(N, s) and the exact integer
+    binomials for the terms of `P`, computing them the first time each N
+    is seen.'''
+    if not N in _stephens_coefs:
+        ss = np.arange(0, N / 2.)
+        sign = np.where(ss % 2 == 0, 1., -1.)
+        lbinom = gammaln(N + 1) - gammaln(ss + 1) - gammaln(N - ss + 1)
+        binoms = [1]
+        for s in xrange(1, len(ss)):
+            binoms.append(binoms[-1] * (N - s + 1) // s)
+        _stephens_coefs[N] = (ss, sign, lbinom, binoms)
+    return _stephens_coefs[N]
+
+# largest acceptable estimate of the relative round-off in log_P's
+# floating point sum, beyond which it is summed exactly
+_LOG_P_RTOL = 1e-12
+
+def _log_P_exact(N, R):
+    '''Returns log(P(N, R)) for one R, summing the alternating series
+    exactly in integers, from the binary value of R.'''
+    binoms = _get_stephens_coefs(N)[3]
+    # R = p / q, so each term is (-1)**s C(N, s) (N q - p - 2 s q)**(N-1)
+    # over the common denominator q**(N-1)
+    r = Fraction(float(R))
+    p, q = r.numerator, r.denominator
+    total = 0
+    for s, c in enumerate(binoms):
+        base = (N - 2 * s) * q - p
+        if base <= 0:
+            break
+        total += (-1)**s * c * base**(N - 1)
+    if total <= 0:
+        return -np.inf
+    # math.log takes longs far beyond the range of a float
+    return math.log(total) - (N - 1) * math.log(q)
+
+def log_P(N, R):
+    '''Returns log(P(N, R)), for arrays of R; -inf where R >= N.
+
+    Terms are evaluated in log space and summed in floating point. The
+    sum alternates, so where cancellation would leave a relative error
+    above _LOG_P_RTOL (e.g. for large N) it is redone exactly, with
+    integer binomials over a common denominator, at some extra cost.'''
+    R = np.asarray(R, dtype=float)
+    ss, sign, lbinom, binoms = _get_stephens_coefs(N)
+    base = N - R[...,None] - 2 * ss
+    pos = base > 0
+    with np.errstate(divide='ignore'):
+        lterms = np.where(pos, lbinom + (N - 1) * np.log(np.where(pos, base, 1.)),
+                          -np.inf)
+    m = lterms.max(-1)
+    finite = np.isfinite(m)
+    m = np.where(finite, m, 0.)
+    scaled = np.exp(lterms - m[...,None])
+    total = (sign * scaled).sum(-1)
+    # round-off in the sum is about eps * sum(|terms|)
+    err = len(ss) * np.finfo(float).eps * scaled.sum(-1)
+    inexact = finite & ~(err < _LOG_P_RTOL * total)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        res = np.where(finite, m + np.log(total), -np.inf)
+    if np.any(inexact):
+        res[inexact] = [_log_P_exact(N, r) for r in R[inexact]]
+    return res[()]
+
+def _dlog_P(N, R):
+    '''Returns the derivative of `log_P` with respect to R.'''
+    R = np.asarray(R, dtype=float)
+    ss, sign, lbinom = _get_stephens_coefs(N)[:3]
+    base = np.maximum(N - R[...,None] - 2 * ss, 0.)
+    terms = sign * np.exp(lbinom) * base**(N - 1)
+    dterms = -(N - 1) * sign * np.exp(lbinom) * base**(N - 2)
+    return dterms.sum(-1) / terms.sum(-1)
+
 def P(N, R):
-    '''from Stephens, 1962b, eqn 4'''
-    ss = np.arange(0, N / 2.)
-    rs = np.empty(ss.size)
-    for i, s in enumerate(ss):
-        rs[i] = (-1)**s * binomial_coef(N,s) * (lclip(N - R - 2 * s))**(N - 1)
-    result = rs.sum()
-    assert(~np.isnan(result))
-    return rs.sum()
-
-def calculate_R0(N, Rstar, alpha): #Ro_low, Ro_high):
-    Ro_low = 0
-    Ro_high = N
-    return opt.fminbound(prob_fn, Ro_low, Ro_high,
-                         args=(N, Rstar, alpha))#, disp=0)
-    #return gradient_descent(prob_fn, start=3*Rstar/4., args=(N, Rstar, alpha))
+    '''from Stephens, 1962b, eqn 4
+
+    Vectorized over R.'''
+    return np.exp(log_P(N, R))
+
+# tables of log P(N, R) against R, per N, for calculate_R0
+_R0_TABLE_NMAX = 30
+_R0_TABLE_SIZE = 1024
+_r0_tables = {}
+
+def _get_r0_table(N):
+    '''Returns (R, log P(N, R)) on a grid over 0 <= R < N, building it
+    the first time each N is seen.'''
+    if not N in _r0_tables:
+        Rs = np.linspace(0, N, _R0_TABLE_SIZE + 1)[:-1]
+        _r0_tables[N] = (Rs, log_P(N, Rs))
+    return _r0_tables[N]
+
+def calculate_R0(N, Rstar, alpha, method=None): #Ro_low, Ro_high):
+    '''Returns R0, such that P(N, R0) / P(N, Rstar) = alpha.
+
+    Parameters
+    ----------
+    N : int
+      number of vectors
+    Rstar, alpha : float or array_like
+      broadcast against each other
+    method : string
+      'table' - interpolation in a cached table of log P(N, R), refined
+                by Newton steps on log P
+      'fminbound' - minimize prob_fn, one value at a time
+      default is 'table' for N <= 30, otherwise 'fminbound'
+    '''
+    if method is None:
+        method = 'table' if N <= _R0_TABLE_NMAX else 'fminbound'
+    if method == 'fminbound':
+        Ro_low = 0
+        Ro_high = N
+        fn = lambda Rs, a : opt.fminbound(prob_fn, Ro_low, Ro_high,
+                                          args=(N, Rs, a))#, disp=0)
+        return np.vectorize(fn, otypes=[float])(Rstar, alpha)[()]
+        #return gradient_descent(prob_fn, start=3*Rstar/4., args=(N, Rstar, alpha))
+    elif method != 'table':
+        raise ValueError("unknown method %s" % (method))
+    Rstar, alpha = np.broadcast_arrays(np.asarray(Rstar, dtype=float),
+                                       np.asarray(alpha, dtype=float))
+    target = np.log(alpha) + log_P(N, Rstar)
+    Rs, lPs = _get_r0_table(N)
+    # log P decreases with R
+    R0 = np.interp(-target, -lPs, Rs, right=Rs[-1])
+    hi = N * (1 - 1e-12)
+    for i in xrange(3):
+        R0 = np.clip(R0 - (log_P(N, R0) - target) / _dlog_P(N, R0), 0, hi)
+    return R0[()]
 
 def prob_fn(Ro, N, Rstar, alpha):
-    return (P(N, Ro) / P(N, Rstar) - alpha)**2
+    # as a difference of logs, since P itself overflows for large N
+    return (np.exp(log_P(N, Ro) - log_P(N, Rstar)) - alpha)**2
+
 #----------------------------------------------------------------------------
 
-def estimate_confid_angle(P_i, alpha, mu=None, verbose=False):
+def stephens_cone_angle(N, R, alpha):
+    '''Returns the (1 - alpha) * 100% confidence cone angle about the
+    sample mean of N vectors with resultant length R, kappa unknown
+    (Stephens, 1962b).
+
+    Given the component Z of the resultant along a candidate mean
+    direction, Pr(R > R0 | Z) = P(N, R0) / P(N, Z), whatever kappa is, so
+    the candidate is rejected if the observed R exceeds R0(Z) (see
+    `calculate_R0`). The cone's edge is therefore where R0(Z) = R, i.e.
+    P(N, Z) = P(N, R) / alpha, at an angle arccos(Z / R). Where even
+    Z = 0 is not rejected, no direction can be excluded and the angle
+    is pi.
+
+    R and alpha may be arrays, and are broadcast together.'''
+    R, alpha = np.broadcast_arrays(np.asarray(R, dtype=float),
+                                   np.asarray(alpha, dtype=float))
+    Z = calculate_R0(N, R, 1. / alpha)
+    theta = np.arccos(np.clip(Z / R, -1, 1))
+    unbounded = log_P(N, R) > np.log(alpha) + log_P(N, 0.)
+    return np.where(unbounded, np.pi, theta)[()]
+
+def estimate_confid_angle(P_i, alpha, mu=None, verbose=False,
+                          kappa_method='powell'):
+    '''Returns the (1 - alpha) * 100% confidence cone angle about the
+    sample mean direction of unit vectors P_i, shape (n, 3).
+
+    mu, if known, is used in estimating kappa, with `kappa_method` (see
+    `estimate_kappa_batch`). For khat < 5 and n <= 30 the cone comes from
+    `stephens_cone_angle`; otherwise from closed-form approximations.'''
     log = np.log
     sqrt = np.sqrt
     arccos = np.arccos
     z = 2
     n = P_i.shape[0]
     R, S = calc_R(P_i)
-    if mu == None:
+    if mu is None:
         mu = S/R
     #Rz = R * mu[z]
     Rz = R
     
-    khat = estimate_kappa(P_i, mu=mu)
+    khat = estimate_kappa(P_i, mu=mu, method=kappa_method)
     #print "khat %3f" % (khat)
     if khat < 5:
         if n <= 30:
-            R0 = calculate_R0(n, Rz, alpha)
-            theta_alpha = arccos(R0 / R)
+            theta_alpha = stephens_cone_angle(n, R, alpha)
         elif (n > 8) & (n < 30):
             if (Rz > 0) & (Rz < n/4.):
                 Ra1 = sqrt(Rz**2 - 2 / 3. * n * log( alpha ))
@@ -315,6 +961,60 @@ def estimate_confid_angle(P_i, alpha, mu=None, verbose=False):
                              ((1 / alpha)**(1/float(n-1)) - 1))
     return theta_alpha
 
+def estimate_confid_angle_batch(P_i, alpha, mu=None, offsets=None,
+                                kappa_method='newton'):
+    '''Returns the (1 - alpha) * 100% confidence cone angles of many sets of
+    vectors at once, as `estimate_confid_angle` would for each set.
+
+    Parameters
+    ----------
+    P_i : array_like, shape (n_sets, n_pts, 3) or (n_total, 3)
+      unit vectors; see `calc_R_batch` for layout
+    alpha : float or array_like, shape (n_sets,)
+      probability of acceptable alpha error
+    mu : array_like, shape (3,) or (n_sets, 3), optional
+      known population mean direction(s), used in estimating kappa
+    offsets : array_like, shape (n_sets + 1,), optional
+      set boundaries for ragged input; see `calc_R_batch`
+    kappa_method : string
+      estimator of khat, see `estimate_kappa_batch`; 'powell' reproduces
+      `estimate_confid_angle` exactly, one set at a time, while 'newton'
+      solves for all sets at once and matches `estimate_confid_angle`
+      with kappa_method='newton'
+
+    Returns
+    -------
+    theta_alpha : ndarray, shape (n_sets,)
+      angle from the mean vector describing each confidence cone
+
+    Notes
+    -----
+    Sets with khat < 5 and n <= 30 use `stephens_cone_angle`, solved for
+    all sets of the same size together; the remaining sets use the
+    closed forms.
+    '''
+    khat, mean, R = estimate_kappa_batch(P_i, mu=mu, offsets=offsets,
+                                         method=kappa_method)
+    if offsets is None:
+        n = np.ones_like(R) * np.shape(P_i)[1]
+    else:
+        n = np.diff(np.asarray(offsets)).astype(float)
+    alpha = np.ones_like(R) * alpha
+    theta_alpha = np.empty_like(R)
+    low_k = khat < 5
+    stephens = low_k & (n <= 30)
+    large_n = low_k & (n > 30)
+    high_k = ~low_k
+    for N in np.unique(n[stephens]):
+        sel = stephens & (n == N)
+        theta_alpha[sel] = stephens_cone_angle(int(N), R[sel], alpha[sel])
+    theta_alpha[large_n] = np.arccos(1 + np.log(alpha[large_n]) / \
+                                         (khat[large_n] * R[large_n]))
+    nh, Rh, ah = n[high_k], R[high_k], alpha[high_k]
+    theta_alpha[high_k] = np.arccos(1 - ((nh - Rh) / Rh) *
+                                    ((1 / ah)**(1 / (nh - 1)) - 1))
+    return theta_alpha
+
 def calc_confid_angle(P_i, alpha, mu=None):
     '''calculates the (1 - alpha) * 100% confidence interval for the given
     distribution of spherically distributed pts P_i
@@ -337,7 +1037,7 @@ def calc_confid_angle(P_i, alpha, mu=None):
 
     n = P_i.shape[0]
     R, S = calc_R(P_i)
-    if mu == None:
+    if mu is None:
         mu = S/R
     Rz = R * mu[z]
     # n <= 8 find R^0_{1-\alpha}
@@ -348,19 +1048,25 @@ def calc_confid_angle(P_i, alpha, mu=None):
 
 # dispersion measurement -----------------------------------------------------
 
-def measure_percentile_angle_ex_kappa(kappa, percentile=0.95, n_pts=int(1e3)):
+def measure_percentile_angle_ex_kappa(kappa, percentile=0.95, n_pts=int(1e3),
+                                      method='ppf'):
     '''
-    Creates a random distribution with large `n` and dispersion `kappa`,
-    and finds the angle that encompasses `confid` * 100% of the pts. 
+    Finds the angle that encompasses `percentile` * 100% of a
+    von-Mises-Fisher distribution with dispersion `kappa`, either exactly,
+    from the quantile function, or by creating a random distribution with
+    large `n` and measuring it.
     
     Parameters
     ----------
-    kappa : float
+    kappa : float or array_like
         dispersion parameter of points
-    percentile : float
+    percentile : float or array_like
         proportion of points to include inside angle
     n_pts : int
-        number of points to create in distribution
+        number of points to create in distribution, for method 'sample'
+    method : string
+        'ppf' - use `vmf_ppf`; kappa and percentile may be arrays
+        'sample' - measure `n_pts` random points
 
     Returns
     -------
@@ -372,6 +1078,10 @@ def measure_percentile_angle_ex_kappa(kappa, percentile=0.95, n_pts=int(1e3)):
     In this case I think theta_alpha does not depend on n, so it is best
     to estimate with a large n for better accuracy.
     '''
+    if method == 'ppf':
+        return vmf_ppf(percentile, kappa)
+    elif method != 'sample':
+        raise ValueError("unknown method %s" % (method))
     perpvec = np.array((0., 0., 1.))
     P_i = vmf_rvs(perpvec, kappa, n_pts=n_pts)
     return measure_percentile_angle(P_i, percentile=percentile)
@@ -1,5 +1,7 @@
 import numpy as np
-from amcmorl_py_tools.vecgeom import unitvec, unitvec_f2d
+from numpy.testing import assert_equal, assert_almost_equal, \
+    assert_array_almost_equal
+from amcmorl_py_tools.vecgeom import unitvec, unitvec_f2d, norm
 
 def test_unitvec():
     a = np.array([[ 0.50654606,  0.05050327],
@@ -32,3 +34,20 @@ def test_unitvec_f2d():
     uvf = unitvec_f2d(a)
     uv = unitvec(a, axis=1)
     np.testing.assert_array_equal(uv, uvf)
+
+def test_unitvec_inplace():
+    a = np.array([[3., 4., 0.], [0., 0., 0.], [1., 2., 2.]], dtype=np.float32)
+    uv = unitvec(a, axis=1, out=a)
+    assert uv is a
+    assert_equal(a.dtype, np.float32)
+    assert_array_almost_equal(a, np.array([[.6, .8, 0.], [0., 0., 0.],
+                                           [1/3., 2/3., 2/3.]]))
+
+def test_norm():
+    a = np.random.normal(size=(4, 3, 5))
+    assert_array_almost_equal(norm(a, axis=1),
+                              np.sqrt(np.sum(a**2, axis=1)))
+    assert_almost_equal(norm(a), np.sqrt(np.sum(a**2)))
+    out = np.empty((4, 3))
+    norm(a, axis=-1, out=out)
+    assert_array_almost_equal(out, np.sqrt(np.sum(a**2, axis=-1)))
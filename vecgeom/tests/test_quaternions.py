@@ -0,0 +1,46 @@
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_equal
+from amcmorl_py_tools.vecgeom.quaternions import QuatArray
+from amcmorl_py_tools.vecgeom import transformations as tr
+
+def random_quats(n):
+    return QuatArray(np.random.normal(size=(n, 4)), normalize=True)
+
+def test_product_and_inverse():
+    p, q = random_quats(10), random_quats(10)
+    pq = p * q
+    assert_array_almost_equal(pq.to_DCM(),
+                              np.matmul(p.to_DCM(), q.to_DCM()))
+    ident = (p * p.inverse()).q
+    assert_array_almost_equal(ident, np.tile([0., 0., 0., 1.], (10, 1)))
+
+def test_dcm_conventions():
+    q = random_quats(5)
+    assert_array_almost_equal(q.to_DCM(),
+                              np.array([tr.quat2DCM(qi) for qi in q.q]))
+    r = QuatArray.from_DCM(q.to_DCM())
+    assert_array_almost_equal(np.abs(np.einsum('ij,ij->i', q.q, r.q)),
+                              np.ones(5))
+
+def test_rotate():
+    pts = np.random.normal(size=(7, 3))
+    q = random_quats(1)
+    assert_array_almost_equal(q.rotate(pts), np.dot(pts, q.to_DCM()[0].T))
+    qs = random_quats(7)
+    assert_array_almost_equal(qs.rotate(pts),
+        np.einsum('nij,nj->ni', qs.to_DCM(), pts))
+    # scaling a quaternion does not change its rotation
+    scaled = QuatArray(qs.q * np.linspace(0.2, 3., 7)[:,None])
+    assert_array_almost_equal(scaled.rotate(pts), qs.rotate(pts))
+
+def test_slerp_nlerp():
+    p = QuatArray.from_axang([[0., 0., 0.], [0., 0., 0.]])
+    q = QuatArray.from_axang([[0., 0., np.pi / 2.], [0., 0., 0.]])
+    mid = p.slerp(q, 0.5)
+    assert_array_almost_equal(mid.to_axang(),
+                              np.array([[0., 0., np.pi / 4.], [0., 0., 0.]]))
+    ts = np.array([0.25, 1.])
+    assert_array_almost_equal(p.slerp(q, ts).to_axang(),
+                              np.array([[0., 0., np.pi / 8.], [0., 0., 0.]]))
+    assert_array_almost_equal(p.nlerp(q, 0.5).q, mid.q)
+    assert_equal(len(mid), 2)
@@ -0,0 +1,42 @@
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+from amcmorl_py_tools.vecgeom import transformations as tr
+
+orders = ['xyx', 'yzy', 'zxz', 'xzx', 'yxy', 'zyz',
+          'xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']
+
+def random_euls(order, n=20):
+    eul = np.random.uniform(-np.pi, np.pi, size=(n, 3))
+    if order[0] == order[2]:
+        eul[:,1] = np.random.uniform(0.1, np.pi - 0.1, size=n)
+    else:
+        eul[:,1] = np.random.uniform(-np.pi/2. + 0.1, np.pi/2. - 0.1, size=n)
+    return eul
+
+def test_batch_matches_scalar():
+    for order in orders:
+        eul = random_euls(order)
+        quat = tr.eul2quat_batch(eul, order)
+        DCM = tr.eul2DCM_batch(eul, order)
+        axang = tr.quat2axang_batch(quat)
+        assert_array_almost_equal(quat,
+            np.array([tr.eul2quat(e, order) for e in eul]))
+        assert_array_almost_equal(DCM,
+            np.array([tr.eul2DCM(e, order) for e in eul]))
+        assert_array_almost_equal(tr.quat2eul_batch(quat, order),
+            np.array([tr.quat2eul(q, order) for q in quat]))
+        assert_array_almost_equal(tr.DCM2eul_batch(DCM, order), eul)
+        assert_array_almost_equal(tr.quat2DCM_batch(quat),
+            np.array([tr.quat2DCM(q) for q in quat]))
+        assert_array_almost_equal(tr.DCM2quat_batch(DCM),
+            np.array([tr.DCM2quat(D.copy()) for D in DCM]))
+        assert_array_almost_equal(axang,
+            np.array([tr.quat2axang(q) for q in quat]))
+        assert_array_almost_equal(tr.axang2quat_batch(axang),
+            np.array([tr.axang2quat(a) for a in axang]))
+        assert_array_almost_equal(tr.axang2DCM_batch(axang), DCM)
+    # identity, and rotations by 2 pi (w = -1), with and without round-off
+    quat = np.array([[0., 0., 0., 1.], [0., 0., 0., -1.], [0., 0., 0., -0.],
+                     tr.axang2quat(np.array([0., 0., 2 * np.pi]))])
+    assert_array_almost_equal(tr.quat2axang_batch(quat),
+        np.array([tr.quat2axang(q) for q in quat]))
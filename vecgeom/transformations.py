@@ -467,21 +467,21 @@ def quat2eul(quat, order):
 #        Euler_type=1
     elif order == 'yzx':
         psi=arctan2(2*(quat[1]*quat[3]-quat[0]*quat[2]),
-                    square(quat[3])-square(quat[0]) - \
-                        square(quat[1])+square(quat[2]))
+                    square(quat[3])+square(quat[0]) - \
+                        square(quat[1])-square(quat[2]))
         theta=arcsin(2*(quat[0]*quat[1]+quat[2]*quat[3]))
         phi=arctan2(2*(quat[0]*quat[3]-quat[2]*quat[1]),
-                    square(quat[3])+square(quat[0]) - \
+                    square(quat[3])-square(quat[0]) + \
                         square(quat[1])-square(quat[2]))
 #        Euler_type=1
     elif order == 'zxy':
         psi=arctan2(2*(quat[2]*quat[3]-quat[0]*quat[1]),
-                    square(quat[3])-square(quat[0]) - \
-                        square(quat[1])+square(quat[2]))
+                    square(quat[3])-square(quat[0]) + \
+                        square(quat[1])-square(quat[2]))
         theta=arcsin(2*(quat[0]*quat[3]+quat[1]*quat[2]))
         phi=arctan2(2*(quat[1]*quat[3]-quat[2]*quat[0]),
-                    square(quat[3])+square(quat[0]) - \
-                        square(quat[1])-square(quat[2]))
+                    square(quat[3])-square(quat[0]) - \
+                        square(quat[1])+square(quat[2]))
 #        Euler_type=1
     elif order == 'xzy':
         psi=arctan2(2*(quat[0]*quat[3]+quat[1]*quat[2]),
@@ -590,3 +590,331 @@ def DCMdiff(a, b):
     '''
     return np.dot(a, b.T)
 
+
+#==============================================================================
+# Batched conversions, for arrays of N orientations
+#==============================================================================
+
+_EULER_ORDERS = ['xyx', 'yzy', 'zxz', 'xzx', 'yxy', 'zyz',
+                 'xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']
+
+def _build_euler_table():
+    '''
+    Returns a dict mapping each rotation order to (i, j, k, parity, proper),
+    where i, j, k are the indices of the first, second and remaining axes,
+    parity is +1 if (i, j, k) is a cyclic permutation of (0, 1, 2) and -1
+    otherwise, and proper is True for orders where the first and last axes
+    are the same.
+    '''
+    axis_index = {'x' : 0, 'y' : 1, 'z' : 2}
+    table = {}
+    for order in _EULER_ORDERS:
+        i, j = axis_index[order[0]], axis_index[order[1]]
+        k = 3 - i - j
+        parity = 1 if (j - i) % 3 == 1 else -1
+        table[order] = (i, j, k, parity, order[0] == order[2])
+    return table
+
+_EULER_TABLE = _build_euler_table()
+
+def _euler_entry(order):
+    try:
+        return _EULER_TABLE[order]
+    except KeyError:
+        raise ValueError("unknown rotation order %s" % (order))
+
+def _axis_rot_batch(axis, theta):
+    '''
+    Construct rotation matrices for rotations about one axis.
+
+    Parameters
+    ----------
+    axis : int
+      0, 1 or 2 for x, y or z
+    theta : ndarray
+      shape (N,), angles in radians
+
+    Returns
+    -------
+    R : ndarray
+      shape (N,3,3), rotation matrices as given by Rx, Ry or Rz
+    '''
+    c, s = cos(theta), sin(theta)
+    a, b = (axis + 1) % 3, (axis + 2) % 3
+    R = zeros(theta.shape + (3,3))
+    R[:,axis,axis] = 1
+    R[:,a,a] = c
+    R[:,b,b] = c
+    R[:,a,b] = -s
+    R[:,b,a] = s
+    return R
+
+def _axis_quat_batch(axis, theta):
+    '''
+    Construct quaternions, shape (N,4), for rotations about one axis.
+    '''
+    q = zeros(theta.shape + (4,))
+    q[:,axis] = sin(theta / 2.)
+    q[:,3] = cos(theta / 2.)
+    return q
+
+def quat_mult_batch(p, q):
+    '''
+    Hamilton product of quaternions, scalar part last, as used by the
+    other functions in this module.
+
+    Parameters
+    ----------
+    p, q : array_like
+      shape (N,4) or (4,), quaternions; broadcast against each other
+
+    Returns
+    -------
+    pq : ndarray
+      shape (N,4), products
+    '''
+    p, q = asarray(p, dtype=float), asarray(q, dtype=float)
+    pv, pw = p[...,:3], p[...,3:]
+    qv, qw = q[...,:3], q[...,3:]
+    v = pw * qv + qw * pv + np.cross(pv, qv)
+    w = pw * qw - sum(pv * qv, axis=-1)[...,None]
+    return np.concatenate([v, w], axis=-1)
+
+def _normalize_quat_batch(quat):
+    return quat / sqrt(sum(square(quat), axis=-1))[...,None]
+
+def eul2DCM_batch(eul, order):
+    '''
+    Construct direction cosine matrices from euler angles.
+
+    Parameters
+    ----------
+    eul : array_like
+        shape (N,3), euler angles
+    order : string
+        len 3, order of rotations
+
+    Returns
+    -------
+    DCM : ndarray
+        shape (N,3,3) rotation matrices, as given by `eul2DCM`
+    '''
+    eul = asarray(eul, dtype=float)
+    i, j, k, parity, proper = _euler_entry(order)
+    last = i if proper else k
+    return np.matmul(np.matmul(_axis_rot_batch(i, eul[:,0]),
+                               _axis_rot_batch(j, eul[:,1])),
+                     _axis_rot_batch(last, eul[:,2]))
+
+def eul2quat_batch(eul, order):
+    '''
+    Construct rotation quaternions from euler angles.
+
+    Parameters
+    ----------
+    eul : array_like
+        shape (N,3), euler angles
+    order : string
+        len 3, order of rotations
+
+    Returns
+    -------
+    quat : ndarray
+        shape (N,4), quaternions, as given by `eul2quat`
+    '''
+    eul = asarray(eul, dtype=float)
+    i, j, k, parity, proper = _euler_entry(order)
+    last = i if proper else k
+    quat = quat_mult_batch(quat_mult_batch(_axis_quat_batch(i, eul[:,0]),
+                                           _axis_quat_batch(j, eul[:,1])),
+                           _axis_quat_batch(last, eul[:,2]))
+    return _normalize_quat_batch(quat)
+
+def quat2DCM_batch(quat):
+    '''
+    Construct direction cosine matrices from rotation quaternions.
+
+    Parameters
+    ----------
+    quat : array_like
+        shape (N,4), quaternions
+
+    Returns
+    -------
+    DCM : ndarray
+        shape (N,3,3) rotation matrices, as given by `quat2DCM`
+    '''
+    quat = asarray(quat, dtype=float)
+    x, y, z, w = quat[:,0], quat[:,1], quat[:,2], quat[:,3]
+    xx, yy, zz, ww = square(x), square(y), square(z), square(w)
+    DCM = np.empty((quat.shape[0], 3, 3))
+    DCM[:,0,0] = xx - yy - zz + ww
+    DCM[:,1,0] = 2 * (x * y + z * w)
+    DCM[:,2,0] = 2 * (x * z - y * w)
+    DCM[:,0,1] = 2 * (x * y - z * w)
+    DCM[:,1,1] = -xx + yy - zz + ww
+    DCM[:,2,1] = 2 * (y * z + x * w)
+    DCM[:,0,2] = 2 * (x * z + y * w)
+    DCM[:,1,2] = 2 * (y * z - x * w)
+    DCM[:,2,2] = -xx - yy + zz + ww
+    return DCM
+
+def DCM2eul_batch(DCM, order):
+    '''
+    Construct euler angles from direction cosine matrices.
+
+    Parameters
+    ----------
+    DCM : array_like
+        shape (N,3,3) rotation matrices
+    order : string
+        len 3, order of rotations
+
+    Returns
+    -------
+    eul : ndarray
+        shape (N,3), euler angles; the second angle lies in [-pi/2, pi/2]
+        for orders with three different axes, and [0, pi] otherwise
+    '''
+    R = asarray(DCM, dtype=float)
+    i, j, k, parity, proper = _euler_entry(order)
+    eul = np.empty((R.shape[0], 3))
+    if proper:
+        eul[:,0] = arctan2(R[:,j,i], -parity * R[:,k,i])
+        eul[:,1] = arccos(np.clip(R[:,i,i], -1, 1))
+        eul[:,2] = arctan2(R[:,i,j], parity * R[:,i,k])
+    else:
+        eul[:,0] = arctan2(-parity * R[:,j,k], R[:,k,k])
+        eul[:,1] = arcsin(np.clip(parity * R[:,i,k], -1, 1))
+        eul[:,2] = arctan2(-parity * R[:,i,j], R[:,i,i])
+    return eul
+
+def quat2eul_batch(quat, order):
+    '''
+    Construct euler angles from rotation quaternions.
+
+    Parameters
+    ----------
+    quat : array_like
+        shape (N,4), quaternions
+    order : string
+        len 3, order of rotations
+
+    Returns
+    -------
+    eul : ndarray
+        shape (N,3), euler angles, as given by `quat2eul`
+    '''
+    return DCM2eul_batch(quat2DCM_batch(quat), order)
+
+def DCM2quat_batch(DCM):
+    '''
+    Construct rotation quaternions from direction cosine matrices.
+
+    Parameters
+    ----------
+    DCM : array_like
+        shape (N,3,3) rotation matrices
+
+    Returns
+    -------
+    quat : ndarray
+        shape (N,4), quaternions, as given by `DCM2quat`; unlike `DCM2quat`,
+        the input is not modified
+    '''
+    D = asarray(DCM, dtype=float).transpose(0,2,1)
+    D = np.where(np.isclose(D, 0), 0., D)
+    d00, d11, d22 = D[:,0,0], D[:,1,1], D[:,2,2]
+    denom = 0.5 * sqrt(np.maximum(np.column_stack(
+        [1 + d00 - d11 - d22,
+         1 - d00 + d11 - d22,
+         1 - d00 - d11 + d22,
+         1 + d00 + d11 + d22]), 0))
+    # choose the largest component to divide by, for each matrix
+    big = np.argmax(denom, axis=1)
+    d = denom[np.arange(denom.shape[0]), big]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f = 1 / (4 * d)
+    s01, s02, s12 = D[:,0,1] + D[:,1,0], D[:,0,2] + D[:,2,0], \
+        D[:,1,2] + D[:,2,1]
+    a01, a20, a12 = D[:,0,1] - D[:,1,0], D[:,2,0] - D[:,0,2], \
+        D[:,1,2] - D[:,2,1]
+    # rows: candidate quaternions when dividing by component 0, 1, 2, 3
+    cands = np.array([[d, s01 * f, s02 * f, a12 * f],
+                      [s01 * f, d, s12 * f, a20 * f],
+                      [s02 * f, s12 * f, d, a01 * f],
+                      [a12 * f, a20 * f, a01 * f, d]])
+    quat = cands[big, :, np.arange(denom.shape[0])]
+    return _normalize_quat_batch(quat)
+
+def quat2axang_batch(quat):
+    '''
+    Construct axis/angle from rotation quaternions.
+
+    Parameters
+    ----------
+    quat : array_like
+        shape (N,4), quaternions
+
+    Returns
+    -------
+    axang : ndarray
+        shape (N,3), axis/angle in compact form, as given by `quat2axang`
+    '''
+    quat = asarray(quat, dtype=float)
+    vlen = sqrt(sum(quat[:,0:3] * quat[:,0:3], axis=1))
+    angle = 2 * arctan2(vlen, quat[:,3])
+    s = sin(angle / 2)
+    # where sin(angle/2) vanishes, the axis is taken as x, as in quat2axang
+    axang = zeros((quat.shape[0], 3))
+    axang[:,0] = angle
+    ok = s > 0
+    axang[ok] = quat[ok,0:3] / s[ok,None] * angle[ok,None]
+    return axang
+
+def axang2quat_batch(axang):
+    '''
+    Construct rotation quaternions from axis/angle.
+
+    Parameters
+    ----------
+    axang : array_like
+        shape (N,3), axis/angle in compact form, or (N,4), unit axis
+        followed by angle
+
+    Returns
+    -------
+    quat : ndarray
+        shape (N,4), quaternions, as given by `axang2quat`
+    '''
+    axang = asarray(axang, dtype=float)
+    if axang.shape[1] == 3:
+        angle = sqrt(sum(square(axang), axis=1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            axis = axang / angle[:,None]
+    elif axang.shape[1] == 4:
+        angle = axang[:,3]
+        axis = axang[:,0:3]
+    else:
+        raise ValueError("axang must have shape (N,3) or (N,4)")
+    axis = nan_to_num(axis)
+    quat = np.empty((axang.shape[0], 4))
+    quat[:,0:3] = axis * sin(angle / 2)[:,None]
+    quat[:,3] = cos(angle / 2)
+    return _normalize_quat_batch(quat)
+
+def eul2axang_batch(eul, order):
+    '''Batched `eul2axang`; `eul` has shape (N,3).'''
+    return quat2axang_batch(eul2quat_batch(eul, order))
+
+def axang2eul_batch(axang, order):
+    '''Batched `axang2eul`; `axang` has shape (N,3).'''
+    return quat2eul_batch(axang2quat_batch(axang), order)
+
+def axang2DCM_batch(axang):
+    '''Batched `axang2DCM`; `axang` has shape (N,3).'''
+    return quat2DCM_batch(axang2quat_batch(axang))
+
+def DCM2axang_batch(DCM):
+    '''Batched `DCM2axang`; `DCM` has shape (N,3,3).'''
+    return quat2axang_batch(DCM2quat_batch(DCM))
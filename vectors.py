@@ -1,5 +1,6 @@
 import numpy as np
 from numpy import cos, sin, array, dot
+from amcmorl_py_tools.vecgeom import sqnorm, norm, unitvec
 
 from warnings import warn
 warn("This module is deprecated. Use vecgeom package instead.")
@@ -12,13 +13,6 @@ def vec2str(vec, dp=2):
     fstr = " ".join(["%5." + "%d" % dp + "f"] * l)
     return fstr % (tuple(vec))
 
-def norm(vec, axis=None):
-    '''
-    Return length of vector
-    '''
-    vec = np.asarray(vec)
-    return np.sqrt(np.sum(vec**2, axis=axis))
-
 def perpz(vec):
     '''returns the unit length vector perpendicular
     to vec and lying in the x-y plane (i.e. z = 0).
@@ -35,25 +29,6 @@ def perpz(vec):
     else:
         return unitvec( (vec[1], -vec[0]) )
 
-def _unitvec(vec):
-    '''returns the unit length vector
-    in the same direction as vec'''
-    vec = np.asarray(vec)
-    return vec / np.sqrt(np.sum(vec ** 2))
-
-def unitvec(arr, axis=-1):
-    '''
-    Returns unit length vector in same direction as vec
-
-    Parameters
-    ----------
-    vec : sequence
-      vector to normalize
-    axis : int, optional
-      axis along which to normalize, defaults to last
-    '''
-    return np.apply_along_axis(_unitvec, axis, arr)
-
 def angle_between(a, b):
     '''returns the angle (in rads) between 2 vectors'''
 
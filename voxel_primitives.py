@@ -1,29 +1,92 @@
 import numpy as n
 from numpy.linalg import norm
 from coordhandling import unitvec
+from amcmorl_py_tools.image.parallel import run_slabs, n_workers
 import time
 
-def cylinder( vdim, A, D, r, inds=None):
+# largest number of voxels evaluated at once when slabbing automatically
+_SLAB_VOXELS = 2**22
+
+def _check_out(vdim, out):
+    '''Returns `out`, or a new boolean volume if it is None, after checking
+    it is either a boolean volume of shape `vdim` or a bit-packed uint8
+    volume (as from numpy.packbits along the last axis).'''
+    if out is None:
+        return n.empty(vdim, dtype=bool)
+    packed_shape = vdim[:-1] + ((vdim[-1] + 7) // 8,)
+    if not (((out.dtype == bool) and (out.shape == vdim)) or
+            ((out.dtype == n.uint8) and (out.shape == packed_shape))):
+        raise ValueError("out must be a boolean array of shape %s or a "
+                         "uint8 array of shape %s" % \
+                         (str(vdim), str(packed_shape)))
+    return out
+
+def _rasterize(fn, vdim, inds=None, out=None, slab=None, workers=None):
+    '''Evaluates the boolean function `fn` of voxel co-ordinates over a
+    volume of size `vdim`, a slab of planes along the first axis at a time,
+    writing the results into `out`.
+
+    `fn` is given a list of one index array per dimension. These are open
+    (broadcastable, as from n.ogrid) grids restricted to the current slab,
+    unless `inds` (a full n.indices-style array) is supplied, in which case
+    the corresponding slices of it are used. Memory use beyond `out` is
+    proportional to the slab size, not the volume size. Slabs are shared
+    between `workers` threads (see image.parallel.run_slabs).'''
+    vdim = tuple([int(d) for d in vdim])
+    out = _check_out(vdim, out)
+    if slab is None:
+        slab = max(1, _SLAB_VOXELS // max(1, int(n.prod(vdim[1:]))))
+        if workers is not None:
+            slab = min(slab, -(-vdim[0] // (4 * n_workers(workers))))
+    rest = [slice(0, d) for d in vdim[1:]]
+
+    def task(x0, x1):
+        if inds is None:
+            grid = n.ogrid[tuple([slice(x0, x1)] + rest)]
+        else:
+            grid = [ind[x0:x1] if ind.shape[0] > 1 else ind for ind in inds]
+        res = n.broadcast_to(fn(grid), (x1 - x0,) + vdim[1:])
+        if out.dtype == bool:
+            out[x0:x1] = res
+        else:
+            out[x0:x1] = n.packbits(res, axis=-1)
+    run_slabs(task, vdim[0], slab=slab, workers=workers)
+    return out
+
+def cylinder( vdim, A, D, r, inds=None, out=None, slab=None, workers=None ):
     '''usage: cyl = cylinder( vdim, A, D, r )
     creates a volume of size vdim containing a binary (1s inside)
-    cylinder running through A, in direction D, with radius r'''
+    cylinder running through A, in direction D, with radius r
+
+    out, if given, is a preallocated boolean volume, or a bit-packed uint8
+    volume (see numpy.packbits), to write into; slab is the number of
+    planes along the first axis to evaluate at once (by default chosen to
+    keep temporaries small); workers is the number of threads to share
+    the slabs between (-1 for one per CPU)'''
     
     D = unitvec( n.asarray( D, dtype=float ) )
     A = n.asarray( A, dtype=float )
-    if inds == None:
-        Xi = n.indices( vdim )
-    else:
-        Xi = inds
-    Y = Xi - A[:, n.newaxis, n.newaxis, n.newaxis]   # vectors from A to Xi
-    Ytr = Y.transpose(1,2,3,0)
-    di = n.inner( D, Ytr )        # length along D to point nearest Xi
-    dims = di.shape
-    tmp = Y - di[n.newaxis,...] * D[:, n.newaxis, n.newaxis, n.newaxis]
-    comp = n.sqrt( (tmp**2).sum(0) )
-    vol = r >= comp
-    return vol
 
-def clip_plane(vdim, p, norm, inds=None):
+    inside = lambda Xi : _in_cylinder(Xi, A, D, r)
+    return _rasterize(inside, vdim, inds=inds, out=out, slab=slab,
+                      workers=workers)
+
+def _in_cylinder(Xi, A, D, r, length=None):
+    '''Tests whether co-ordinates Xi (a list of broadcastable arrays) lie
+    within r of the line through A in (unit) direction D, and, if length is
+    given, between the planes through A and A + length * D.'''
+    Y = [Xi[i] - A[i] for i in range(3)]   # vectors from A to Xi
+    di = D[0] * Y[0] + D[1] * Y[1] + D[2] * Y[2] # length along D to
+                                                 # point nearest Xi
+    comp = (Y[0] - di * D[0])**2
+    comp += (Y[1] - di * D[1])**2
+    comp += (Y[2] - di * D[2])**2
+    inside = r >= n.sqrt(comp, out=comp)
+    if length is not None:
+        inside &= (di >= 0) & (di <= length)
+    return inside
+
+def clip_plane(vdim, p, norm, inds=None, out=None, slab=None, workers=None):
     ''' Creates a volume containing 0s and 1s separated by a defined
     plane. Useful for clipping volumes (by multiplying by result).
 
@@ -42,21 +105,22 @@ def clip_plane(vdim, p, norm, inds=None):
 
            a(x-x0) + b(y-y0) + c(z-z0) = 0
 
-    when norm = (a, b, c) & r = (x, y, z)'''
+    when norm = (a, b, c) & r = (x, y, z)
+
+    See cylinder for out, slab and workers.'''
 
     norm = n.asarray(norm)
     p = n.asarray(p)
 
-    if inds == None:
-        co = n.indices( vdim )
-    else:
-        co = inds
-    pl = norm[...,n.newaxis,n.newaxis,n.newaxis] * \
-         (co - p[...,n.newaxis,n.newaxis,n.newaxis] )
-    pl = pl.sum(0)
-    return (pl >= 0)
+    def inside(co):
+        pl = norm[0] * (co[0] - p[0])
+        for i in range(1, len(co)):
+            pl = pl + norm[i] * (co[i] - p[i])
+        return (pl >= 0)
+    return _rasterize(inside, vdim, inds=inds, out=out, slab=slab,
+                      workers=workers)
 
-def sphere( vdim, c, r, inds=None ):
+def sphere( vdim, c, r, inds=None, out=None, slab=None, workers=None ):
     '''create_sphere - return a volume containing a binary
     sphere defined by a point and a radius
 
@@ -66,37 +130,128 @@ Usage:
 
 where vdim = dimensions of volume
       c     = centre point
-      r     = radius'''
+      r     = radius
+
+See cylinder for out, slab and workers.'''
     c = n.asarray(c)
 
-    if inds == None:
-        Xi = n.indices( vdim )
-    else:
-        Xi = inds
+    inside = lambda Xi : _in_sphere(Xi, c, r)
+    return _rasterize(inside, vdim, inds=inds, out=out, slab=slab,
+                      workers=workers)
 
-    return r >= n.sqrt( ((Xi - c[...,n.newaxis,n.newaxis,n.newaxis\
-                                 ])**2).sum(0) )
+def _in_sphere(Xi, c, r):
+    '''Tests whether co-ordinates Xi (a list of broadcastable arrays) lie
+    within r of c.'''
+    dsq = (Xi[0] - c[0])**2
+    for i in range(1, len(Xi)):
+        dsq = dsq + (Xi[i] - c[i])**2
+    return r >= n.sqrt(dsq)
 
-def identity3d( dims, iswhere=False, inds=None ):
+def identity3d( dims, iswhere=False, inds=None, out=None, slab=None,
+                workers=None ):
     '''Creates a volume with 1s only along the 3D diagonal
     i.e. where x = y = z
 
     id3d = identity3d( dims )
 
     where dims is a tuple of the desired volume dimensions.
-    Also supports 2d.'''
-    if inds == None:
-        inds = n.indices( dims )
-        
+    Also supports 2d. See cylinder for out, slab and workers.'''
     ndims = len( dims )
-    arr = n.array( (inds[0] == inds[1]) )
-    if ndims == 3:
-        arr = arr & n.array( (inds[0] == inds[2]) )
+
+    def diagonal(inds):
+        arr = (inds[0] == inds[1])
+        if ndims == 3:
+            arr = arr & (inds[0] == inds[2])
+        return arr
+    arr = _rasterize(diagonal, dims, inds=inds, out=out, slab=slab,
+                     workers=workers)
     if not iswhere:
         return arr
     else:
         return n.where(arr)
 
+# stamping primitives into existing volumes -----------------------------------
+
+def _stamp(vol, lo, hi, inside, mode):
+    '''Evaluates `inside` on the open grid of voxels of `vol` lying within
+    the bounding box lo..hi (float co-ordinates, inclusive) and composites
+    the result into `vol`.'''
+    if vol.dtype != bool:
+        raise ValueError("vol must be a boolean array")
+    if not mode in ['union', 'intersection', 'subtract']:
+        raise ValueError("mode must be 'union', 'intersection' or "
+                         "'subtract'")
+    start = n.maximum(n.ceil(lo), 0).astype(int)
+    stop = n.minimum(n.floor(hi).astype(int) + 1, vol.shape)
+    if n.any(stop <= start):
+        # primitive lies entirely outside vol
+        if mode == 'intersection':
+            vol[...] = False
+        return vol
+    box = tuple([slice(i, j) for i, j in zip(start, stop)])
+    mask = inside(n.ogrid[box])
+    if mode == 'union':
+        vol[box] |= mask
+    elif mode == 'subtract':
+        vol[box] &= ~mask
+    else:
+        inner = vol[box] & mask
+        vol[...] = False
+        vol[box] = inner
+    return vol
+
+def stamp_sphere(vol, c, r, mode='union'):
+    '''Composites a sphere with centre c and radius r into the boolean
+    volume vol, in place, evaluating only voxels inside the sphere's
+    bounding box.
+
+    mode is one of:
+      'union' - set voxels inside the sphere
+      'intersection' - clear voxels outside the sphere
+      'subtract' - clear voxels inside the sphere
+
+    Returns vol. Voxels are set exactly as by sphere(vol.shape, c, r).'''
+    c = n.asarray(c, dtype=float)
+    inside = lambda Xi : _in_sphere(Xi, c, r)
+    return _stamp(vol, c - r, c + r, inside, mode)
+
+def stamp_cylinder(vol, A, D, r, length=None, mode='union'):
+    '''Composites a cylinder running through A, in direction D, with radius
+    r into the boolean volume vol, in place, evaluating only voxels inside
+    the cylinder's bounding box.
+
+    If length is given, the cylinder is finite, with flat ends through A
+    and A + length * D. Otherwise it is infinite, as for cylinder(), and
+    voxels are set exactly as by cylinder(vol.shape, A, D, r).
+
+    See stamp_sphere for mode. Returns vol.'''
+    D = unitvec( n.asarray( D, dtype=float ) )
+    A = n.asarray( A, dtype=float )
+    if length is None:
+        # the nearest point on the axis to any voxel inside the cylinder
+        # lies within r of the volume along every axis, which bounds the
+        # part of the axis that matters
+        t0, t1 = -n.inf, n.inf
+        for Ai, Di, sz in zip(A, D, vol.shape):
+            lo, hi = -r - Ai, sz - 1 + r - Ai
+            if Di != 0:
+                ta, tb = sorted((lo / Di, hi / Di))
+                t0, t1 = max(t0, ta), min(t1, tb)
+            elif (lo > 0) or (hi < 0):
+                t0, t1 = 0., -1.
+        if t1 < t0:
+            if mode == 'intersection':
+                vol[...] = False
+            return vol
+    else:
+        t0, t1 = 0., length
+    ends = n.vstack((A + t0 * D, A + t1 * D))
+    # the ends are discs of radius r normal to D
+    extent = r * n.sqrt(n.maximum(1 - D**2, 0))
+    inside = lambda Xi : _in_cylinder(Xi, A, D, r, length=length)
+    return _stamp(vol, ends.min(0) - extent, ends.max(0) + extent,
+                  inside, mode)
+
 def circlecoords( cx, cy, r, start=0, finish=2*n.pi, npts=100 ):
     a = n.linspace(start, finish, npts)
     xs = cx + r * n.sin( a )